@@ -0,0 +1,121 @@
+"""Aho-Corasick automaton for finding several search words in a single pass."""
+
+import re
+from collections import deque
+from typing import Iterable, Optional
+
+# texts longer than this are scanned by re, in C, instead of the per-character loop
+LONG_TEXT = 4096
+
+
+class AhoCorasick(object):
+    """Finds all occurrences of a set of words in one scan of the text.
+
+    The automaton is built once per query. The failure links are folded into
+    a complete transition table, so the scan is a single dict lookup per
+    character, no matter how many words the query has. That loop still runs
+    in Python, so the spans of long texts are found with a regular expression.
+    """
+
+    def __init__(self, words: Iterable[str]) -> None:
+        self.words: list[str] = list(dict.fromkeys(word for word in words if word))
+
+        goto: list[dict[str, int]] = [{}]
+        longest = [0]  # length of the longest word ending in each state
+        found = [0]  # bitmask of the words ending in each state
+        for index, word in enumerate(self.words):
+            state = 0
+            for char in word:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    longest.append(0)
+                    found.append(0)
+                state = next_state
+            longest[state] = len(word)
+            found[state] |= 1 << index
+
+        # breadth first, so the failure state of a state is always complete before the state itself
+        fail = [0] * len(goto)
+        delta: list[dict[str, int]] = [{}] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fallback = fail[state]
+            longest[state] = max(longest[state], longest[fallback])
+            found[state] |= found[fallback]
+            delta[state] = {**delta[fallback], **goto[state]}
+            for char, next_state in goto[state].items():
+                if state:
+                    fail[next_state] = delta[fallback].get(char, 0)
+                queue.append(next_state)
+
+        self._delta = delta
+        self._longest = longest
+        self._found = found
+        self.all_found = (1 << len(self.words)) - 1
+        self._pattern: Optional[re.Pattern] = None
+
+    def found(self, text: str) -> int:
+        """Return the bitmask of the words that occur in ``text``."""
+        delta = self._delta
+        found = self._found
+        state = 0
+        mask = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            mask |= found[state]
+        return mask
+
+    def spans(self, text: str) -> list[tuple[int, int]]:
+        """Return the (start, end) spans of all matches, overlapping matches merged."""
+        if len(text) > LONG_TEXT:
+            return self._long_spans(text)
+        delta = self._delta
+        longest = self._longest
+        state = 0
+        spans: list[tuple[int, int]] = []
+        for end, char in enumerate(text, 1):
+            state = delta[state].get(char, 0)
+            length = longest[state]
+            if length:
+                start, stop = end - length, end
+                while spans and start <= spans[-1][1]:
+                    start = min(start, spans[-1][0])
+                    stop = max(stop, spans[-1][1])
+                    spans.pop()
+                spans.append((start, stop))
+        return spans
+
+    def _long_spans(self, text: str) -> list[tuple[int, int]]:
+        if not self.words:
+            return []
+        if self._pattern is None:
+            # the longest word starting at each position; in a lookahead, so
+            # overlapping matches are found as well
+            self._pattern = re.compile('(?=(%s))' % '|'.join(
+                re.escape(word) for word in sorted(self.words, key=len, reverse=True)))
+        spans: list[tuple[int, int]] = []
+        for match in self._pattern.finditer(text):
+            start, stop = match.span(1)
+            if spans and start <= spans[-1][1]:
+                if stop > spans[-1][1]:
+                    spans[-1] = (spans[-1][0], stop)
+            else:
+                spans.append((start, stop))
+        return spans
+
+    def required_words(self) -> list[str]:
+        """Return the words not contained in another word, longest first.
+
+        A line that contains "banana" also contains "ban", so only the
+        remaining words have to be tested to decide whether a line matches.
+        """
+        redundant = 0
+        for index, word in enumerate(self.words):
+            redundant |= self.found(word) & ~(1 << index)
+        return sorted((word for index, word in enumerate(self.words) if not redundant >> index & 1),
+                      key=len, reverse=True)
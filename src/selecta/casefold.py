@@ -0,0 +1,77 @@
+"""Case-insensitive search of a list of lines.
+
+Case-insensitive means comparing casefolded text ("Straße" contains "SS").
+Keeping a casefolded copy of every line would double the memory, although
+for ASCII lines, almost all of a shell history, casefolding is just
+lowercasing. So lines are folded in bulk while they're searched: a batch of
+ASCII lines is joined, lowercased and split again in one go, and only the
+lines with other characters get a casefolded shadow, made the first time a
+search reaches them.
+"""
+
+import sys
+from typing import Optional, Sequence
+
+
+class FoldedLines(object):
+    """Casefolded view of ``lines`` for case-insensitive substring search."""
+
+    # lines folded at once
+    batch_size = 4096
+
+    def __init__(self, lines: list[str]) -> None:
+        self.lines = lines
+        # casefolded non-ASCII lines by index
+        self.shadow: dict[int, str] = {}
+
+    def fold(self, indices: Sequence[int]) -> list[str]:
+        """Return the casefolded lines at ``indices``."""
+        lines = self.lines
+        if isinstance(indices, range) and indices.step == 1:
+            batch = lines[indices.start:indices.stop]
+        else:
+            batch = [lines[i] for i in indices]
+
+        text = '\n'.join(batch)
+        if text.isascii():
+            folded = text.lower().split('\n')
+            if len(folded) == len(batch):
+                return folded
+            return [line.lower() for line in batch]  # some line had a newline in it
+
+        shadow = self.shadow
+        folded = []
+        for i, line in zip(indices, batch):
+            if line.isascii():
+                folded.append(line.lower())
+            else:
+                folded_line = shadow.get(i)
+                if folded_line is None:
+                    folded_line = shadow[i] = line.casefold()
+                folded.append(folded_line)
+        return folded
+
+    def find_words(self, words: list[str], indices: Optional[Sequence[int]] = None) -> list[int]:
+        """Return the indices of the lines containing all ``words``, ignoring case."""
+        words = [word.casefold() for word in words]
+        first, rest = words[0], words[1:]
+        if indices is None:
+            indices = range(len(self.lines))
+
+        matched: list[int] = []
+        for start in range(0, len(indices), self.batch_size):
+            batch = indices[start:start + self.batch_size]
+            folded = self.fold(batch)
+            found = [k for k, line in enumerate(folded) if first in line]
+            for word in rest:
+                found = [k for k in found if word in folded[k]]
+            matched.extend([batch[k] for k in found])
+        return matched
+
+    def remove(self, count: int) -> None:
+        """Forget the shadow of the first ``count`` lines, they were deleted."""
+        self.shadow = {i - count: line for i, line in self.shadow.items() if i >= count}
+
+    def memory(self) -> int:
+        """Return the approximate memory use of the shadow in bytes."""
+        return sys.getsizeof(self.shadow) + sum(map(sys.getsizeof, self.shadow.values()))
@@ -10,7 +10,7 @@ BASH_WRAPPER = r'''
 # selecta shell integration (TIOCSTI-free)
 selecta_insert() {
   local result
-  result=$(selecta -b -y -p -q "$READLINE_LINE" <(history))
+  result=$(selecta -b -y -p -c boost -q "$READLINE_LINE" <(history))
   if [[ -n "$result" ]]; then
     READLINE_LINE="$result"
     READLINE_POINT=${#result}
@@ -22,7 +22,7 @@ ZSH_WRAPPER = r'''
 # selecta shell integration (TIOCSTI-free)
 selecta_insert() {
   local result
-  result=$(selecta -z -y -p -q "$BUFFER" <(history 0))
+  result=$(selecta -z -y -p -c boost -q "$BUFFER" <(history 0))
   if [[ -n "$result" ]]; then
     BUFFER="$result"
     CURSOR=${#BUFFER}
@@ -33,13 +33,44 @@ selecta_insert() {
 FISH_WRAPPER = r'''
 # selecta shell integration (TIOCSTI-free)
 function selecta_insert
-  set -l result (PYTHON_GIL=1 selecta -z -y -p -q (commandline) (history | cut -d " " -f 1 --complement | psub))
+  set -l result (PYTHON_GIL=1 selecta -z -y -p -c boost -q (commandline) (history | cut -d " " -f 1 --complement | psub))
   if test -n "$result"
     commandline -r "$result"
   end
 end
 '''
 
+# Shell hooks that record every command together with its working directory
+# (used by the -c/--cwd mode).
+
+BASH_HOOK = r'''
+_selecta_record_hook() {
+  local entry
+  entry=$(HISTTIMEFORMAT= history 1)
+  [[ "$entry" == "$_selecta_last_entry" ]] && return
+  _selecta_last_entry="$entry"
+  [[ "$entry" =~ ^\ *[0-9]+\*?\ +(.*)$ ]] || return
+  (selecta_record "$PWD" "${BASH_REMATCH[1]}" &>/dev/null &)
+}
+_selecta_last_entry=$(HISTTIMEFORMAT= history 1)
+PROMPT_COMMAND="_selecta_record_hook${PROMPT_COMMAND:+;$PROMPT_COMMAND}"
+'''
+
+ZSH_HOOK = r'''
+_selecta_record_hook() {
+  selecta_record "$PWD" "$1" &>/dev/null &!
+}
+autoload -Uz add-zsh-hook
+add-zsh-hook preexec _selecta_record_hook
+'''
+
+FISH_HOOK = r'''
+function _selecta_record_hook --on-event fish_preexec
+  selecta_record "$PWD" "$argv" &>/dev/null &
+  disown 2>/dev/null
+end
+'''
+
 BASH_BIND = r'''bind -x '"\C-[{key}": selecta_insert' '''
 
 ZSH_BIND = r'''zle -N selecta_insert
@@ -50,16 +81,19 @@ FISH_BIND = r'''bind \e{key} selecta_insert'''
 SHELL_CONFIG = {
     'bash': {
         'wrapper': BASH_WRAPPER,
+        'hook': BASH_HOOK,
         'bind': BASH_BIND,
         'rcfile': '.bashrc',
     },
     'zsh': {
         'wrapper': ZSH_WRAPPER,
+        'hook': ZSH_HOOK,
         'bind': ZSH_BIND,
         'rcfile': '.zshrc',
     },
     'fish': {
         'wrapper': FISH_WRAPPER,
+        'hook': FISH_HOOK,
         'bind': FISH_BIND,
         'rcfile': '.config/fish/config.fish',
     },
@@ -90,6 +124,7 @@ def main():
 
     config = SHELL_CONFIG[shell]
     wrapper = config['wrapper'].strip()
+    hook = config['hook'].strip()
     bind_cmd = config['bind'].format(key=args.key)
     rcfile = os.path.join(os.path.expanduser('~'), config['rcfile'])
     marker = '# selecta shell integration'
@@ -97,6 +132,7 @@ def main():
     if args.print_only:
         print(f'\n{marker}')
         print(wrapper)
+        print(hook)
         print(bind_cmd)
         return
 
@@ -114,7 +150,7 @@ def main():
         print('To reinstall, remove the "# selecta shell integration" block from your rc file.')
     else:
         with open(rcfile, 'a') as f:
-            f.write(f'\n{marker}\n{wrapper}\n{bind_cmd}\n')
+            f.write(f'\n{marker}\n{wrapper}\n{hook}\n{bind_cmd}\n')
 
         print(f'selecta keybinding (Alt+{args.key}) has been added to {rcfile}')
         print()
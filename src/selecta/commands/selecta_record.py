@@ -0,0 +1,23 @@
+import argparse
+
+from selecta.history import HistoryLog, default_log_path
+
+# Called by the shell hook installed with selecta_add_keybinding
+# for every command that is run.
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('cwd', type=str,
+                        help='the directory the command was run in')
+    parser.add_argument('command', type=str,
+                        help='the command line')
+    args = parser.parse_args()
+
+    command = args.command.strip()
+    if command:
+        HistoryLog(default_log_path()).append(args.cwd, command)
+
+
+if __name__ == '__main__':
+    main()
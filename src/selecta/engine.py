@@ -0,0 +1,244 @@
+"""Searching lines without a UI.
+
+A SearchEngine holds the lines and what the searches need (the fields to
+search, the casefolded view, the trigram index) and returns the indices of
+the matching lines. The TUI is a layer over it, and it can be used on its
+own, e.g. in a server::
+
+    engine = SearchEngine(open('history.txt'))
+    engine.search('git pu')                   # array('i', [...])
+    engine.search_many(['git', 'docker run'])  # one scan for both
+"""
+
+import re
+from array import array
+from typing import Iterable, Optional, Sequence, Union
+
+from .aho_corasick import AhoCorasick
+from .casefold import FoldedLines
+from .fields import FieldLines, FieldRange
+from .index import LineIndex
+from .linesource import MappedLines
+from .regex_guard import ExponentialPattern, exponential_reason, search_lines
+
+MODES = ('words', 'literal', 'regexp')
+
+
+class SearchEngine(object):
+    """Finds the lines matching a query.
+
+    ``source`` is a file, which is memory-mapped when it's a regular file
+    (and no fields are searched), or an iterable of lines. A list (or
+    MappedLines) is used as it is, so the caller can add lines later, see
+    ``extend``. With ``nth`` only those fields of the lines, split on
+    ``delimiter``, are searched. Regular expression searches stop after
+    ``regex_budget`` seconds (0: no limit, see ``filter_regex``).
+    """
+
+    # lines folded (and searched for all words of a batch of queries) at once
+    batch_size = FoldedLines.batch_size
+
+    def __init__(self, source: Union[Iterable[str], Sequence[str]], delimiter: Optional[str] = None,
+                 nth: Optional[list[FieldRange]] = None, regex_budget: float = 0.0) -> None:
+        if isinstance(source, (list, MappedLines)):
+            self.lines = source
+        elif not nth and MappedLines.usable(source):
+            self.lines = MappedLines(source)
+        else:
+            self.lines = [line.strip() for line in source]
+        self.regex_budget = regex_budget
+
+        self.search_fields = FieldLines(self.lines, nth, delimiter) if nth else None
+        # the text searched for each line
+        self.search_lines: Sequence[str] = self.search_fields if self.search_fields is not None else self.lines
+        # mapped lines are searched as bytes and need neither of them
+        self.mapped = isinstance(self.lines, MappedLines)
+        self.folded = FoldedLines(self.search_lines) if not self.mapped else None
+        self.index: Optional[LineIndex] = None
+
+        # automaton of the last search words, ((words, case), AhoCorasick)
+        self._matcher: Optional[tuple[tuple[tuple[str, ...], bool], AhoCorasick]] = None
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def build_index(self) -> Optional[LineIndex]:
+        """Build the trigram index of the lines; None for mapped lines, which don't use one."""
+        if self.mapped:
+            return None
+        index = LineIndex()
+        for start in range(0, len(self.search_lines), self.batch_size):
+            index.add(self.folded.fold(range(start, min(len(self.search_lines), start + self.batch_size))))
+        self.index = index
+        return index
+
+    def extend(self, new_lines: list[str]) -> None:
+        """Add (stripped) lines at the end."""
+        start = len(self.lines)
+        self.lines.extend(new_lines)
+        if self.search_fields is not None:
+            self.search_fields.update()
+        if self.index is not None:
+            self.index.add(self.folded.fold(range(start, len(self.lines))))
+
+    def remove(self, count: int) -> None:
+        """Drop the first ``count`` lines."""
+        del self.lines[:count]
+        if self.search_fields is not None:
+            self.search_fields.remove(count)
+        if self.folded is not None:
+            self.folded.remove(count)
+        if self.index is not None:
+            self.index.remove(count)
+
+    def word_matcher(self, words: list[str], case_sensitive: bool) -> AhoCorasick:
+        """Return the automaton for the search words (built once per query)."""
+        key = (tuple(words), case_sensitive)
+        matcher = self._matcher  # read once, searches may run in other threads
+        if matcher is None or matcher[0] != key:
+            matcher = self._matcher = (key, AhoCorasick(words if case_sensitive
+                                                        else [word.casefold() for word in words]))
+        return matcher[1]
+
+    def search(self, query: str, mode: str = 'words', case_sensitive: bool = False) -> array:
+        """Return the indices of the lines matching ``query``, in order.
+
+        ``mode`` is 'words' (the lines containing all words of the query),
+        'literal' (the lines starting with the query) or 'regexp'. An empty
+        query matches all lines. Raises ValueError for an unknown mode,
+        ``re.error`` for an invalid regular expression and
+        ExponentialPattern for one that backtracks exponentially.
+        """
+        if mode not in MODES:
+            raise ValueError(f'unknown search mode {mode!r}, not one of {", ".join(MODES)}')
+        if mode == 'words':
+            if not query.split():
+                return array('i', range(len(self.lines)))
+            return array('i', self.filter_words(query, case_sensitive))
+        if mode == 'literal':
+            return array('i', self.filter_literal(query, case_sensitive))
+        return array('i', self.filter_regex(query, case_sensitive)[0])
+
+    def search_many(self, queries: Iterable[str], mode: str = 'words',
+                    case_sensitive: bool = False) -> list[array]:
+        """Return the results of ``search`` for each of ``queries``, sharing the scans.
+
+        Words queries scan the lines once per distinct word, not once per
+        query (with an index each query only tests its candidates instead);
+        literal queries fetch every line once and test it against all
+        prefixes. Regular expressions are searched one after the other, each
+        under the regex budget.
+        """
+        queries = list(queries)
+        if mode not in MODES:
+            raise ValueError(f'unknown search mode {mode!r}, not one of {", ".join(MODES)}')
+        if mode == 'words' and self.index is None:
+            return self._search_words(queries, case_sensitive)
+        if mode != 'literal':
+            return [self.search(query, mode, case_sensitive) for query in queries]
+
+        prefixes = [query if case_sensitive else query.casefold() for query in queries]
+        results: list[array] = [array('i') for _ in queries]
+        lines = self.search_lines
+        for i in range(len(lines)):
+            line = lines[i] if case_sensitive else lines[i].casefold()
+            for prefix, result in zip(prefixes, results):
+                if line.startswith(prefix):
+                    result.append(i)
+        return results
+
+    def _search_words(self, queries: list[str], case_sensitive: bool) -> list[array]:
+        """Search for the words of all queries at once, each word is scanned for once."""
+        query_words = [[word if case_sensitive else word.casefold() for word in query.split()]
+                       for query in queries]
+        words = list(dict.fromkeys(word for query in query_words for word in query))
+        hits: dict[str, list[int]] = {word: [] for word in words}
+
+        if self.mapped:
+            for word in words:
+                hits[word] = self.lines.find_words([word], case_sensitive)
+        else:
+            lines = self.search_lines
+            for start in range(0, len(lines), self.batch_size):
+                stop = min(len(lines), start + self.batch_size)
+                batch = lines[start:stop] if case_sensitive else self.folded.fold(range(start, stop))
+                for word in words:
+                    hits[word].extend([i for i, line in enumerate(batch, start) if word in line])
+
+        hit_sets: dict[str, set[int]] = {}
+        results = []
+        for query in query_words:
+            if not query:
+                results.append(array('i', range(len(self.lines))))
+                continue
+            rarest, *rest = sorted(set(query), key=lambda word: len(hits[word]))
+            found = hits[rarest]
+            for word in rest:
+                if word not in hit_sets:
+                    hit_sets[word] = set(hits[word])
+                found = [i for i in found if i in hit_sets[word]]
+            results.append(array('i', found))
+        return results
+
+    def filter_words(self, search_text: str, case_sensitive: bool,
+                     indices: Optional[Sequence[int]] = None) -> list[int]:
+        """Return the indices of the lines containing all words of ``search_text``.
+
+        ``indices`` optionally restricts the scan to a subset of line indices
+        (used to narrow the previous result while the query is being extended).
+        """
+        # the automaton tells which words are implied by longer ones
+        required = self.word_matcher(search_text.split(), case_sensitive).required_words()
+        if not required:
+            return list(range(len(self.lines)) if indices is None else indices)
+
+        if self.mapped:
+            return self.lines.find_words(required, case_sensitive, indices)
+
+        if indices is None and self.index is not None:
+            indices = self.index.candidates(required)
+
+        if not case_sensitive:
+            return self.folded.find_words(required, indices)
+
+        if indices is None:
+            indices = range(len(self.lines))
+        lines = self.search_lines
+        if len(required) == 1:
+            word = required[0]
+            return [i for i in indices if word in lines[i]]
+        return [i for i in indices if all(word in lines[i] for word in required)]
+
+    def filter_literal(self, prefix: str, case_sensitive: bool = True,
+                       indices: Optional[Sequence[int]] = None) -> list[int]:
+        """Return the indices of the lines starting with ``prefix``."""
+        if indices is None:
+            indices = range(len(self.lines))
+        if not case_sensitive:
+            prefix = prefix.casefold()
+            lines = self.search_lines
+            return [i for i in indices if lines[i].casefold().startswith(prefix)]
+
+        if self.mapped:
+            return self.lines.find_prefix(prefix, indices)
+        lines = self.search_lines
+        return [i for i in indices if lines[i].startswith(prefix)]
+
+    def filter_regex(self, pattern: str, case_sensitive: bool,
+                     indices: Optional[Sequence[int]] = None) -> tuple[list[int], bool]:
+        """Return the indices of the lines matching a regular expression.
+
+        ``indices`` optionally restricts the scan to a subset of line indices.
+        The search stops when the regex budget is used up; the second value
+        tells whether it got through all lines. Raises ``re.error`` for an
+        invalid pattern and ExponentialPattern for one that backtracks
+        exponentially (which the budget can only cut short).
+        """
+        reason = exponential_reason(pattern)
+        if reason is not None:
+            raise ExponentialPattern(f'pattern too slow: {reason}')
+        if indices is None:
+            indices = range(len(self.lines))
+
+        re_search = re.compile(pattern, re.IGNORECASE if not case_sensitive else 0).search
+        return search_lines(re_search, self.search_lines, indices, self.regex_budget)
@@ -0,0 +1,114 @@
+"""Fields of the lines, for searching and showing only some of them.
+
+A line is split into fields on a delimiter, or on runs of whitespace when
+there is none. ``--nth`` restricts the search (and the highlighting) to some
+fields, ``--with-nth`` shows only some. The fields are found once, when the
+lines are loaded: the start and end of every chosen field range go into an
+array of offsets, so a search slices each line at known positions instead
+of splitting it again on every key.
+"""
+
+import re
+from array import array
+from typing import Optional, Sequence, Union
+
+# first and last field of a range, numbered from 1, negative numbers count
+# from the end; a last field of None means up to the last field
+FieldRange = tuple[int, Optional[int]]
+
+NON_SPACE = re.compile(r'\S+')
+
+
+def field_ranges(spec: str) -> list[FieldRange]:
+    """Parse a comma separated list of fields like ``2``, ``-1``, ``2..4``, ``3..`` or ``..2``.
+
+    Raises ValueError for anything else.
+    """
+    ranges: list[FieldRange] = []
+    for part in spec.split(','):
+        first, dots, last = part.strip().partition('..')
+        if not dots:
+            ranges.append((int(first), int(first)))
+        else:
+            ranges.append((int(first) if first else 1, int(last) if last else None))
+        if 0 in ranges[-1]:
+            raise ValueError('fields are numbered from 1')
+    return ranges
+
+
+class FieldLines(Sequence[str]):
+    """The chosen fields of ``lines``, as a sequence of the text of those fields.
+
+    ``offsets`` holds the start and end of each range for each line; a range
+    that doesn't exist in a line is empty. The text of several ranges is
+    joined with the delimiter (a space when splitting on whitespace).
+    """
+
+    def __init__(self, lines: Sequence[str], ranges: list[FieldRange], delimiter: Optional[str] = None) -> None:
+        self.lines = lines
+        self.ranges = ranges
+        self.delimiter = delimiter or None
+        self.separator = delimiter or ' '
+        self.offsets = array('i')
+        self.update()
+
+    def fields(self, line: str) -> list[tuple[int, int]]:
+        """Return the start and end of each field of ``line``."""
+        if self.delimiter is None:
+            return [match.span() for match in NON_SPACE.finditer(line)]
+        spans = []
+        start = 0
+        while True:
+            end = line.find(self.delimiter, start)
+            if end < 0:
+                spans.append((start, len(line)))
+                return spans
+            spans.append((start, end))
+            start = end + len(self.delimiter)
+
+    def update(self) -> None:
+        """Find the fields of the lines added to ``lines`` since the last call."""
+        lines = self.lines
+        append = self.offsets.append
+        for i in range(len(self), len(lines)):
+            fields = self.fields(lines[i])
+            count = len(fields)
+            for first, last in self.ranges:
+                first = first - 1 if first > 0 else count + first
+                last = count - 1 if last is None else last - 1 if last > 0 else count + last
+                first = max(first, 0)
+                last = min(last, count - 1)
+                if first <= last:
+                    append(fields[first][0])
+                    append(fields[last][1])
+                else:
+                    append(0)
+                    append(0)
+
+    def remove(self, count: int) -> None:
+        """Forget the fields of the first ``count`` lines, they were deleted."""
+        del self.offsets[:count * 2 * len(self.ranges)]
+
+    def spans(self, index: int) -> list[tuple[int, int]]:
+        """Return the (non-empty) start and end of each chosen range of a line."""
+        width = 2 * len(self.ranges)
+        offsets = self.offsets[index * width:(index + 1) * width]
+        return [(offsets[k], offsets[k + 1]) for k in range(0, width, 2) if offsets[k] < offsets[k + 1]]
+
+    def __len__(self) -> int:
+        return len(self.offsets) // (2 * len(self.ranges))
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1 and len(self.ranges) == 1:
+                offsets = self.offsets
+                return [line[begin:end] for line, begin, end in
+                        zip(self.lines[start:stop], offsets[2 * start:2 * stop:2], offsets[2 * start + 1:2 * stop:2])]
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        line = self.lines[index]
+        if len(self.ranges) == 1:
+            return line[self.offsets[2 * index]:self.offsets[2 * index + 1]]
+        return self.separator.join(line[start:end] for start, end in self.spans(index))
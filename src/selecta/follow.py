@@ -0,0 +1,127 @@
+"""Follow a growing input (--follow).
+
+Regular files are watched with inotify where the platform has it, other
+platforms fall back to polling the file size. Pipes are watched directly.
+Only the bytes appended since the last read are decoded; complete lines are
+handed to a callback, a trailing partial line waits for its newline.
+"""
+
+import codecs
+import ctypes
+import ctypes.util
+import os
+from typing import Callable, Optional
+
+import urwid
+
+from .linesource import is_regular_file
+
+IN_MODIFY = 0x00000002
+
+READ_SIZE = 1 << 16
+
+
+def inotify_watch(path: str) -> Optional[int]:
+    """Return a non-blocking inotify descriptor watching ``path`` for writes, or None."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None  # no inotify on this platform
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(path), IN_MODIFY) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class Follower(object):
+    """Reads what gets appended to ``infile`` and passes the new lines to ``callback``.
+
+    ``infile`` must already be read up to its current end (the initial lines
+    are parsed by Selecta); following starts at the descriptor's offset.
+    """
+
+    def __init__(self, loop: urwid.MainLoop, infile, callback: Callable[[list[str]], None],
+                 poll_interval: float = 0.5) -> None:
+        self.loop = loop
+        self.fd = infile.fileno()
+        self.name = infile.name
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.decoder = codecs.getincrementaldecoder(getattr(infile, 'encoding', None) or 'utf-8')(errors='replace')
+        self.partial = ''
+        self.regular = is_regular_file(infile)
+        self.offset = os.lseek(self.fd, 0, os.SEEK_CUR) if self.regular else 0
+        self.inotify_fd: Optional[int] = None
+        self._handle = None
+
+    def start(self) -> None:
+        """Start watching the input."""
+        if not self.regular:
+            os.set_blocking(self.fd, False)
+            self._handle = self.loop.watch_file(self.fd, self.read)
+            return
+
+        self.inotify_fd = inotify_watch(self.name)
+        if self.inotify_fd is not None:
+            self._handle = self.loop.watch_file(self.inotify_fd, self._on_inotify)
+        else:
+            self._handle = self.loop.set_alarm_in(self.poll_interval, self._on_poll)
+
+    def stop(self) -> None:
+        """Stop watching the input."""
+        if self._handle is not None:
+            if self.regular and self.inotify_fd is None:
+                self.loop.remove_alarm(self._handle)
+            else:
+                self.loop.remove_watch_file(self._handle)
+            self._handle = None
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    def _on_inotify(self) -> None:
+        try:
+            while os.read(self.inotify_fd, 4096):
+                pass  # the events themselves don't matter, only that something changed
+        except BlockingIOError:
+            pass
+        self.read()
+
+    def _on_poll(self, *_) -> None:
+        self.read()
+        self._handle = self.loop.set_alarm_in(self.poll_interval, self._on_poll)
+
+    def read(self) -> None:
+        """Read everything appended since the last call and pass on the complete lines."""
+        if self.regular and os.fstat(self.fd).st_size < self.offset:
+            # truncated (e.g. log rotation with copytruncate): start over at the top
+            self.offset = os.lseek(self.fd, 0, os.SEEK_SET)
+
+        chunks = []
+        closed = False
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                closed = not self.regular
+                break
+            self.offset += len(data)
+            chunks.append(self.decoder.decode(data))
+
+        text = self.partial + ''.join(chunks)
+        lines = text.split('\n')
+        self.partial = lines.pop()
+        if closed:
+            # the writing end of the pipe is gone, nothing will complete the last line
+            if self.partial:
+                lines.append(self.partial)
+                self.partial = ''
+            self.stop()
+
+        if lines:
+            self.callback(lines)
@@ -0,0 +1,187 @@
+"""Directory-aware command history.
+
+The shell hook installed by ``selecta_add_keybinding`` appends every command
+together with its working directory to a compact, append-only binary log.
+Each record points back to the previous record of the same directory, so the
+commands of a directory are read by walking that chain: a lookup costs
+O(matches), no matter how large the log grows. The only other state is a
+small table holding the newest record of every directory.
+
+Record layout (little endian):
+
+    d  timestamp
+    q  offset of the previous record with the same cwd (-1 if there is none)
+    H  length of the cwd in bytes
+    I  length of the command in bytes
+       cwd and command, utf-8 encoded
+"""
+
+import bisect
+import fcntl
+import heapq
+import mmap
+import os
+import struct
+import time
+from typing import Iterator, NamedTuple, Optional
+
+LOG_MAGIC = b'SELHIST1'
+TABLE_MAGIC = b'SELHIDX1'
+
+RECORD_HEADER = struct.Struct('<dqHI')
+TABLE_HEADER = struct.Struct('<Q')  # size of the log covered by the table
+TABLE_ENTRY = struct.Struct('<qH')  # offset of the newest record, cwd length
+
+
+class Record(NamedTuple):
+    """A single command from the history log."""
+    offset: int
+    timestamp: float
+    cwd: str
+    command: str
+
+
+def default_log_path() -> str:
+    """Return the path of the history log ($SELECTA_HISTORY or the XDG data dir)."""
+    path = os.environ.get('SELECTA_HISTORY')
+    if path:
+        return path
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(data_home, 'selecta', 'history.log')
+
+
+def current_directory() -> str:
+    """Return the logical working directory (the shell's $PWD if it's still valid)."""
+    cwd = os.environ.get('PWD')
+    try:
+        if cwd and os.path.samefile(cwd, '.'):
+            return cwd
+    except OSError:
+        pass
+    return os.getcwd()
+
+
+class HistoryLog(object):
+    """Append-only log of (timestamp, cwd, command) records with a per-cwd index."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.table_path = path + '.idx'
+
+    def append(self, cwd: str, command: str, timestamp: Optional[float] = None) -> None:
+        """Append a command to the log and update the directory table."""
+        cwd_bytes = os.fsencode(cwd)[:0xffff]
+        command_bytes = command.encode('utf-8', 'surrogateescape')
+        if timestamp is None:
+            timestamp = time.time()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'ab+') as log:
+            # several shells may record at the same time
+            fcntl.flock(log, fcntl.LOCK_EX)
+            end = log.seek(0, os.SEEK_END)
+            if end == 0:
+                log.write(LOG_MAGIC)
+                end = len(LOG_MAGIC)
+
+            heads = self._read_heads(log, end)
+            log.write(RECORD_HEADER.pack(timestamp, heads.get(cwd_bytes, -1),
+                                         len(cwd_bytes), len(command_bytes)))
+            log.write(cwd_bytes + command_bytes)
+            log.flush()
+
+            heads[cwd_bytes] = end
+            self._write_heads(heads, log.tell())
+
+    def commands_under(self, cwd: str) -> Iterator[Record]:
+        """Yield the records of ``cwd`` and its subdirectories, newest first."""
+        try:
+            log = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+
+        with log:
+            # the size is read under the lock, the table of a writer that
+            # appended meanwhile then covers exactly this log and is trusted
+            fcntl.flock(log, fcntl.LOCK_SH)
+            try:
+                size = os.fstat(log.fileno()).st_size
+                if size <= len(LOG_MAGIC):
+                    return
+                heads = self._read_heads(log, size)
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+
+            directories = sorted(heads)
+            prefix = os.fsencode(cwd).rstrip(b'/')
+            # the subtree is the directory itself plus every key in [prefix/, prefix0)
+            # ('0' is the byte right after '/', so '/ab' isn't part of '/a')
+            start = bisect.bisect_left(directories, prefix + b'/')
+            stop = bisect.bisect_left(directories, prefix + b'0')
+            subtree = directories[start:stop]
+            if prefix in heads:
+                subtree.append(prefix)
+
+            with mmap.mmap(log.fileno(), size, access=mmap.ACCESS_READ) as data:
+                chains = [self._walk(data, heads[directory]) for directory in subtree]
+                yield from heapq.merge(*chains, key=lambda record: record.offset, reverse=True)
+
+    @staticmethod
+    def _walk(data: mmap.mmap, offset: int) -> Iterator[Record]:
+        """Follow the back pointers of a directory chain."""
+        while offset >= 0:
+            timestamp, previous, cwd_length, command_length = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            cwd = os.fsdecode(data[start:start + cwd_length])
+            start += cwd_length
+            command = data[start:start + command_length].decode('utf-8', 'surrogateescape')
+            yield Record(offset, timestamp, cwd, command)
+            offset = previous
+
+    def _read_heads(self, log, size: int) -> dict[bytes, int]:
+        """Return the newest record offset per cwd for a log of ``size`` bytes.
+
+        The table is only trusted up to the log size it was written for; any
+        records appended after that (or all of them if the table is missing)
+        are scanned and folded in.
+        """
+        heads: dict[bytes, int] = {}
+        covered = len(LOG_MAGIC)
+        try:
+            with open(self.table_path, 'rb') as table:
+                data = table.read()
+            if data.startswith(TABLE_MAGIC):
+                position = len(TABLE_MAGIC)
+                (table_covered,) = TABLE_HEADER.unpack_from(data, position)
+                position += TABLE_HEADER.size
+                entries: dict[bytes, int] = {}
+                while position < len(data):
+                    offset, length = TABLE_ENTRY.unpack_from(data, position)
+                    position += TABLE_ENTRY.size
+                    entries[data[position:position + length]] = offset
+                    position += length
+                if table_covered <= size:
+                    heads, covered = entries, table_covered
+        except (OSError, struct.error):
+            pass  # a broken table is rebuilt from the log
+
+        position = covered
+        while position + RECORD_HEADER.size <= size:
+            header = os.pread(log.fileno(), RECORD_HEADER.size, position)
+            _, _, cwd_length, command_length = RECORD_HEADER.unpack(header)
+            cwd = os.pread(log.fileno(), cwd_length, position + RECORD_HEADER.size)
+            heads[cwd] = position
+            position += RECORD_HEADER.size + cwd_length + command_length
+
+        return heads
+
+    def _write_heads(self, heads: dict[bytes, int], covered: int) -> None:
+        parts = [TABLE_MAGIC, TABLE_HEADER.pack(covered)]
+        for cwd, offset in heads.items():
+            parts.append(TABLE_ENTRY.pack(offset, len(cwd)))
+            parts.append(cwd)
+
+        temp_path = f'{self.table_path}.{os.getpid()}'
+        with open(temp_path, 'wb') as table:
+            table.write(b''.join(parts))
+        os.replace(temp_path, self.table_path)
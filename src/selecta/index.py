@@ -0,0 +1,256 @@
+"""Trigram index of the lines, built in the background.
+
+The index maps every trigram of the casefolded lines to the lines it occurs
+in. It's built in a thread once the first frame is on screen; until it's
+ready the searches scan all lines, afterwards they only test the lines that
+contain all trigrams of the search words.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from typing import TYPE_CHECKING, Callable, Optional, Sequence
+
+from .casefold import FoldedLines
+
+if TYPE_CHECKING:  # the engine uses the index without a UI
+    import urwid
+
+    from .engine import SearchEngine
+
+TRIGRAM = 3
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the set of substrings of length TRIGRAM in ``text``."""
+    return {text[i:i + TRIGRAM] for i in range(len(text) - TRIGRAM + 1)}
+
+
+class LineIndex(object):
+    """Trigram posting lists over the casefolded lines.
+
+    ``postings`` is set to None once the lines hold more than ``max_chars``
+    characters, the index wouldn't be worth its memory anymore.
+
+    Lines are dropped from the front without touching the postings: they
+    hold the lines' numbers since the index was started, ``base`` of which
+    were removed, and are only trimmed once as many lines were removed as
+    are left.
+    """
+
+    max_chars = 1 << 26
+
+    def __init__(self) -> None:
+        self.postings: Optional[dict[str, array]] = defaultdict(lambda: array('i'))
+        self.count = 0
+        self.chars = 0
+        self.base = 0
+        self._trimmed = 0
+
+    def add(self, folded_lines: Sequence[str]) -> None:
+        """Index the (casefolded) lines following the indexed ones."""
+        start = self.base + self.count
+        self.count += len(folded_lines)
+        if self.postings is None:
+            return
+        self.chars += sum(map(len, folded_lines))
+        if self.chars > self.max_chars:
+            self.postings = None
+            return
+        postings = self.postings
+        for i, line in enumerate(folded_lines, start):
+            for gram in trigrams(line):
+                postings[gram].append(i)
+
+    def remove(self, count: int) -> None:
+        """Drop the first ``count`` indexed lines, the following ones move up."""
+        count = min(count, self.count)
+        if not count:
+            return
+        # the lengths of the lines aren't kept, the removed ones count as average
+        self.chars -= self.chars * count // self.count
+        self.count -= count
+        self.base += count
+        if self.postings is not None and self.base - self._trimmed >= self.count:
+            for gram in list(self.postings):
+                posting = self.postings[gram]
+                del posting[:bisect.bisect_left(posting, self.base)]
+                if not posting:
+                    del self.postings[gram]
+            self._trimmed = self.base
+
+    def candidates(self, words: list[str]) -> Optional[list[int]]:
+        """Return the indices of the lines that may contain all ``words``, in order.
+
+        Casefolding is done per character, so a line containing a word also
+        contains it casefolded; this holds for case-sensitive words as well.
+        Returns None when the index can't narrow the search (no trigrams,
+        or words too short to have any).
+        """
+        if self.postings is None:
+            return None
+        grams: set[str] = set()
+        for word in words:
+            grams |= trigrams(word.casefold())
+        if not grams:
+            return None
+
+        postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            if not found:
+                break
+            found.intersection_update(posting)
+        base = self.base
+        return sorted(i - base for i in found if i >= base)
+
+    def memory(self) -> int:
+        """Return the approximate memory use in bytes."""
+        if self.postings is None:
+            return 0
+        return sys.getsizeof(self.postings) + sum(
+            sys.getsizeof(gram) + sys.getsizeof(posting) for gram, posting in self.postings.items())
+
+
+class IndexManager(object):
+    """Builds the LineIndex of the lines an ``engine`` searches in a background thread.
+
+    The lines may grow while the index is built, the lines added meanwhile
+    are indexed when it's taken into use (installed as ``engine.index``). ``on_change`` is called in the
+    main loop whenever the progress changed or the index became ready.
+
+    The thread shares the interpreter with the UI, so it works in small
+    batches and holds off while keys are being typed (see ``pause``).
+    """
+
+    # lines indexed between checks for a pause
+    batch_size = 64
+    # progress steps reported to the main loop
+    steps = 50
+    # how long the build holds off after a key
+    pause_time = 0.1
+
+    def __init__(self, loop: 'urwid.MainLoop', engine: 'SearchEngine',
+                 on_change: Optional[Callable[[], None]] = None) -> None:
+        self.loop = loop
+        self.engine = engine
+        self.on_change = on_change
+        self.progress = 0.0
+        self.build_time: Optional[float] = None
+        self._generation = 0
+        # lines removed from the front since the build started
+        self._removed = 0
+        self._result: Optional[tuple[int, LineIndex]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pipe: Optional[int] = None
+        self._pipe_lock = threading.Lock()
+        self._resume_at = 0.0
+
+    @property
+    def index(self) -> Optional[LineIndex]:
+        return self.engine.index
+
+    @property
+    def building(self) -> bool:
+        return self._thread is not None and self.engine.index is None
+
+    def start(self) -> None:
+        """Start building the index."""
+        if self._pipe is None:
+            self._pipe = self.loop.watch_pipe(self._on_pipe)
+        self.progress = 0.0
+        self._removed = 0
+        lines = self.engine.search_lines[:]  # the follower may shorten the list while we're building
+        self._thread = threading.Thread(target=self._build, args=(lines, self._generation),
+                                        name='selecta-index', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Abandon a build in progress."""
+        self._generation += 1
+        with self._pipe_lock:
+            if self._pipe is not None:
+                os.close(self._pipe)
+                self._pipe = None
+
+    def remove(self, count: int) -> None:
+        """Note that the first ``count`` lines were removed.
+
+        An index in use was updated by the engine, one still being built is
+        updated when it's taken into use.
+        """
+        if self.engine.index is None:
+            self._removed += count
+
+    def pause(self) -> None:
+        """Hold off the build for a moment, the UI needs the interpreter."""
+        self._resume_at = time.monotonic() + self.pause_time
+
+    def _build(self, lines: list[str], generation: int) -> None:
+        started = time.perf_counter()
+        paused = 0.0
+        folded = FoldedLines(lines)  # a shadow of its own, the main thread's isn't shared
+        index = LineIndex()
+        reported = 0
+        for start in range(0, len(lines), self.batch_size):
+            while (wait := self._resume_at - time.monotonic()) > 0:
+                time.sleep(wait)
+                paused += wait
+            if generation != self._generation:
+                return  # stopped
+            index.add(folded.fold(range(start, min(len(lines), start + self.batch_size))))
+            if index.postings is None:
+                break  # too large, not worth finishing
+
+            self.progress = min(1.0, (start + self.batch_size) / len(lines))
+            if int(self.progress * self.steps) > reported:
+                reported = int(self.progress * self.steps)
+                self._notify()
+
+        self.build_time = time.perf_counter() - started - paused
+        self._result = (generation, index)
+        self._notify()
+
+    def _notify(self) -> None:
+        with self._pipe_lock:
+            if self._pipe is not None:
+                os.write(self._pipe, b'.')
+
+    def _on_pipe(self, _) -> None:
+        self.poll()
+        if self.on_change is not None:
+            self.on_change()
+
+    def poll(self) -> Optional[LineIndex]:
+        """Return the index, taking a finished build into use; None while building."""
+        engine = self.engine
+        if engine.index is None and self._result is not None:
+            generation, index = self._result
+            self._result = None
+            if generation == self._generation:
+                index.remove(self._removed)
+                index.add(engine.folded.fold(range(index.count, len(engine.search_lines))))
+                engine.index = index
+        return engine.index
+
+    def wait(self) -> Optional[LineIndex]:
+        """Wait for the build to finish and return the index."""
+        if self._thread is not None:
+            self._thread.join()
+        return self.poll()
+
+    def report(self) -> str:
+        """Return a line with the build time and memory use of the index."""
+        index = self.poll()
+        if index is None:
+            return f'index: not finished ({self.progress:.0%})'
+        if index.postings is None:
+            return f'index: not used, more than {LineIndex.max_chars} characters'
+        return (f'index: {index.count} lines, built in {self.build_time:.2f} s, '
+                f'{index.memory() / (1 << 20):.1f} MiB, '
+                f'casefolded shadow of {len(self.engine.folded.shadow)} non-ASCII lines '
+                f'{self.engine.folded.memory() / (1 << 20):.1f} MiB')
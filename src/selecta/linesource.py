@@ -0,0 +1,193 @@
+"""Memory-mapped lines of a regular file.
+
+Opening a file only maps it and records where each line starts; a line is
+decoded to ``str`` when it's accessed (rendered, highlighted or selected).
+Words are searched for directly in the mapped bytes.
+"""
+
+import bisect
+import codecs
+import mmap
+import os
+import stat
+from array import array
+from typing import Optional, Sequence, Union
+
+
+def is_regular_file(infile) -> bool:
+    """Return whether ``infile`` is backed by a regular file."""
+    try:
+        return stat.S_ISREG(os.fstat(infile.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        return False  # e.g. io.StringIO
+
+
+class MappedLines(Sequence[str]):
+    """Read-only sequence of the (stripped) lines of a memory-mapped file."""
+
+    # encodings where a newline is the byte b'\n' and ASCII is encoded as itself
+    ENCODINGS = ('utf-8', 'ascii')
+    # bytes searched (and lowercased for case-insensitive words) at once
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, infile, encoding: str = 'utf-8') -> None:
+        self.encoding = encoding
+        self._map = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # offsets[i] is the start of line i, offsets[i + 1] - 1 its end (the newline)
+        offsets = array('q', [0])
+        append = offsets.append
+        find = self._map.find
+        position = 0
+        while True:
+            position = find(b'\n', position) + 1
+            if not position:
+                break
+            append(position)
+        size = len(self._map)
+        if offsets[-1] != size:
+            append(size + 1)  # last line without a trailing newline
+        self.offsets = offsets
+        # casefolded non-ASCII lines by index (ASCII lines are lowercased as bytes)
+        self._folded: dict[int, str] = {}
+        # indices of the non-ASCII lines of the chunks that have any, by first line index
+        self._non_ascii: dict[int, list[int]] = {}
+
+    @classmethod
+    def usable(cls, infile) -> bool:
+        """Return whether ``infile`` is a non-empty regular file in a supported encoding."""
+        if not is_regular_file(infile):
+            return False
+        try:
+            encoding = codecs.lookup(getattr(infile, 'encoding', None) or 'utf-8').name
+        except LookupError:
+            return False
+        return encoding in cls.ENCODINGS and os.fstat(infile.fileno()).st_size > 0
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.line_bytes(index).decode(self.encoding, 'replace').strip()
+
+    def line_bytes(self, index: int) -> bytes:
+        """Return the raw bytes of a line, without the newline."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('line index out of range')
+        return self._map[self.offsets[index]:self.offsets[index + 1] - 1]
+
+    def find_words(self, words: list[str], case_sensitive: bool,
+                   indices: Optional[Sequence[int]] = None) -> list[int]:
+        """Return the indices of the lines containing all ``words``.
+
+        Without ``indices`` the map is scanned in chunks of whole lines, with
+        ``indices`` just those lines are tested. Case-insensitive search
+        compares casefolded text: ASCII lines are lowercased as bytes, lines
+        with other characters are decoded and casefolded once and kept for
+        the following searches.
+        """
+        if not case_sensitive:
+            words = [word.casefold() for word in words]
+        # a casefolded non-ASCII word can't occur in an ASCII line
+        encoded = ([word.encode(self.encoding) for word in words]
+                   if case_sensitive or all(word.isascii() for word in words) else None)
+        offsets = self.offsets
+
+        if indices is not None:
+            return [i for i in indices if self._line_matches(i, words, encoded, case_sensitive)]
+
+        matched: list[int] = []
+        start, count = 0, len(self)
+        while start < count:
+            stop = min(count, max(start + 1, bisect.bisect_right(offsets, offsets[start] + self.CHUNK_SIZE) - 1))
+            chunk = self._map[offsets[start]:offsets[stop]]
+            if case_sensitive:
+                matched.extend(self._find_in_chunk(chunk, start, stop, encoded))
+            elif chunk.isascii():
+                if encoded is not None:
+                    matched.extend(self._find_in_chunk(chunk.lower(), start, stop, encoded))
+            else:
+                matched.extend(self._find_folded(chunk, start, stop, words, encoded))
+            start = stop
+        return matched
+
+    def _find_folded(self, chunk: bytes, start: int, stop: int, words: list[str],
+                     encoded: Optional[list[bytes]]) -> list[int]:
+        """Return the indices of the lines ``start`` to ``stop`` (in a non-ASCII chunk) containing all words.
+
+        ``words`` are casefolded, ``encoded`` their bytes if they're ASCII.
+        The chunk is searched lowercased as bytes, which is right for its
+        ASCII lines; the others are searched in their casefolded shadow.
+        """
+        other = self._non_ascii.get(start)
+        if other is None:
+            other = self._non_ascii[start] = [i for i, data in enumerate(chunk.split(b'\n')[:stop - start], start)
+                                              if not data.isascii()]
+        found: list[int] = []
+        if encoded is not None:
+            found = self._find_in_chunk(chunk.lower(), start, stop, encoded)
+            skipped = set(other)  # lowercasing the bytes doesn't fold these
+            found = [i for i in found if i not in skipped]
+        found.extend(i for i in other if all(word in self._folded_line(i) for word in words))
+        return sorted(found)
+
+    def _folded_line(self, i: int) -> str:
+        """Return the casefolded (non-ASCII) line ``i``, kept for the following searches."""
+        folded = self._folded.get(i)
+        if folded is None:
+            folded = self._folded[i] = self.line_bytes(i).decode(self.encoding, 'replace').casefold()
+        return folded
+
+    def _find_in_chunk(self, chunk: bytes, start: int, stop: int, encoded: list[bytes]) -> list[int]:
+        """Return the indices of the lines ``start`` to ``stop`` (in ``chunk``) containing all words.
+
+        Where the first word is rare the scan jumps from one occurrence to the
+        next, where it's common every line of the chunk is tested.
+        """
+        offsets = self.offsets
+        first = encoded[0]
+        hits = chunk.count(first)
+        if not hits:
+            return []
+        if hits * 8 > stop - start:
+            lines = chunk.split(b'\n')
+            found = [i for i, data in enumerate(lines[:stop - start], start) if first in data]
+            for word in encoded[1:]:
+                found = [i for i in found if word in lines[i - start]]
+            return found
+
+        found = []
+        base = offsets[start]
+        position = chunk.find(first)
+        while position >= 0:
+            i = bisect.bisect_right(offsets, base + position, start, stop) - 1
+            end = offsets[i + 1] - base
+            if all(word in chunk[offsets[i] - base:end] for word in encoded[1:]):
+                found.append(i)
+            position = chunk.find(first, end)  # one hit per line is enough
+        return found
+
+    def _line_matches(self, i: int, words: list[str], encoded: Optional[list[bytes]],
+                      case_sensitive: bool) -> bool:
+        data = self._map[self.offsets[i]:self.offsets[i + 1] - 1]
+        if case_sensitive:
+            return all(word in data for word in encoded)
+        if data.isascii():
+            data = data.lower()
+            return encoded is not None and all(word in data for word in encoded)
+        folded = self._folded_line(i)
+        return all(word in folded for word in words)
+
+    def find_prefix(self, prefix: str, indices: Optional[Sequence[int]] = None) -> list[int]:
+        """Return the indices of the lines starting with ``prefix``."""
+        encoded = prefix.strip().encode(self.encoding)
+        # cheap test on the bytes first, the decoded line settles it
+        return [i for i in (range(len(self)) if indices is None else indices)
+                if self.line_bytes(i).lstrip().startswith(encoded) and self[i].startswith(prefix)]
+
+    def close(self) -> None:
+        self._map.close()
@@ -0,0 +1,131 @@
+"""Regular expression searches that can't freeze the UI.
+
+A search runs under a time budget: the re module checks for signals while
+it matches, so an interval timer interrupts even a single catastrophic
+match, and the lines matched until then are returned as a partial result.
+Patterns that obviously backtrack exponentially are recognized before they
+run at all.
+"""
+
+import signal
+import threading
+from typing import Callable, Optional, Sequence
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants  # type: ignore[no-redef]
+    import sre_parse  # type: ignore[no-redef]
+
+REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+GROUPS = (sre_constants.SUBPATTERN,)
+
+
+class RegexTimeout(Exception):
+    """The time budget of a search ran out."""
+
+
+class ExponentialPattern(ValueError):
+    """A pattern was rejected, ``exponential_reason`` tells why."""
+
+
+def _body(items) -> list:
+    """Return the items of a pattern with the groups around them removed."""
+    while len(items) == 1 and items[0][0] in GROUPS:
+        items = items[0][1][-1]
+    return list(items)
+
+
+def _is_unbounded(item) -> bool:
+    return item[0] in REPEATS and item[1][1] == sre_constants.MAXREPEAT
+
+
+def _ambiguous_repeats(body: list) -> bool:
+    """Return whether a repeated body of repeats can be split into iterations in many ways."""
+    if not all(item[0] in REPEATS for item in body) or not any(map(_is_unbounded, body)):
+        return False
+    if len(body) == 1:
+        return True
+    if sum(1 for item in body if item[1][0] > 0) <= 1:
+        return True  # all items but one may match nothing
+    return any(str(item[1][2]) == str(following[1][2]) for item, following in zip(body, body[1:]))
+
+
+def exponential_reason(pattern: str) -> Optional[str]:
+    """Return why ``pattern`` backtracks exponentially, None if it obviously doesn't.
+
+    Recognized are unbounded repeats of nothing but repeats where the
+    split between the iterations is ambiguous: one repeated item, like
+    ``(a+)+``, items that may all match nothing but one, like ``(a*b*)*``,
+    or the same item twice in a row, like ``(a+a+)+``. Also unbounded
+    repeats of identical alternatives, like ``(a|a)*`` or ``(ab|ab)+``.
+    These can match a string in exponentially many ways, which the engine
+    tries one after the other when the rest of the pattern fails. Repeats
+    like ``(\\w+\\s+)+``, where each item needs a character of its own, are
+    left to the time budget.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return None  # re.compile reports that
+
+    def walk(items) -> Optional[str]:
+        for op, av in items:
+            if op in REPEATS:
+                body = _body(av[2])
+                if _is_unbounded((op, av)) and body:
+                    if _ambiguous_repeats(body):
+                        return 'nested quantifiers'
+                    # the parser moves a common prefix out of the alternatives,
+                    # "a|a" ends up as "a" followed by two empty alternatives
+                    for item in body:
+                        if item[0] == sre_constants.BRANCH:
+                            branches = [str(branch) for branch in item[1][1]]
+                            if len(branches) != len(set(branches)):
+                                return 'repeated alternatives that match the same text'
+                subpatterns = [av[2]]
+            elif op in GROUPS:
+                subpatterns = [av[-1]]
+            elif op == sre_constants.BRANCH:
+                subpatterns = av[1]
+            elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                subpatterns = [av[1]]
+            else:
+                continue  # no subpattern, or one that doesn't backtrack (atomic, possessive)
+            for subpattern in subpatterns:
+                reason = walk(subpattern)
+                if reason is not None:
+                    return reason
+        return None
+
+    return walk(parsed)
+
+
+def search_lines(search: Callable[[str], object], lines: Sequence[str], indices: Sequence[int],
+                 budget: float) -> tuple[list[int], bool]:
+    """Return the indices of the lines ``search`` matches, and whether all were searched.
+
+    The search stops when ``budget`` seconds are up; a budget of 0 (or a
+    call outside the main thread, where there are no signals) searches all
+    lines.
+    """
+    if budget <= 0 or threading.current_thread() is not threading.main_thread():
+        return [i for i in indices if search(lines[i])], True
+
+    def on_alarm(*_) -> None:
+        raise RegexTimeout()
+
+    matched: list[int] = []
+    previous = signal.signal(signal.SIGALRM, on_alarm) or signal.SIG_DFL
+    try:
+        try:
+            signal.setitimer(signal.ITIMER_REAL, budget)
+            # extend() keeps what the generator produced when the timeout interrupts it
+            matched.extend(i for i in indices if search(lines[i]))
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except RegexTimeout:
+        return matched, False
+    finally:
+        signal.signal(signal.SIGALRM, previous)
+    return matched, True
@@ -0,0 +1,44 @@
+"""Rendered rows shared between the widgets of a line.
+
+Every list update creates new widgets for the lines it shows, and urwid
+caches canvases per widget, so a row that stays on screen while the query
+is extended would be laid out and rendered all over again. The row cache
+keeps the canvases by what they depend on instead: the line, its
+highlighted parts, the size and whether the row has the focus.
+"""
+
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import urwid
+
+
+class RowCache(object):
+    """LRU cache of rendered rows, ``size`` canvases at most."""
+
+    def __init__(self, size: int = 1024) -> None:
+        self.size = size
+        self.canvases: OrderedDict[Hashable, urwid.Canvas] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[urwid.Canvas]:
+        """Return the canvas rendered for ``key``, None if there is none."""
+        canvas = self.canvases.get(key)
+        if canvas is None:
+            self.misses += 1
+            return None
+        self.canvases.move_to_end(key)
+        self.hits += 1
+        return canvas
+
+    def put(self, key: Hashable, canvas: urwid.Canvas) -> None:
+        """Keep ``canvas`` for ``key``, dropping the least recently used beyond the size."""
+        self.canvases[key] = canvas
+        self.canvases.move_to_end(key)
+        while len(self.canvases) > self.size:
+            self.canvases.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget all rows, the lines at the indices changed."""
+        self.canvases.clear()
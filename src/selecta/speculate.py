@@ -0,0 +1,156 @@
+"""Precomputing the results of the likely next keys while the UI is idle.
+
+Typing a character at the end of a words query only narrows the result:
+the lines matching the longer query are among the lines matching the
+current one. Which character comes next is guessed from the matching lines
+themselves: the characters that follow the last word in them, weighted by
+the number of lines they follow it in. The results for the most frequent
+ones are computed between keys, in slices small enough that a key never
+waits for more than one, and kept in a small LRU cache.
+"""
+
+import string
+from array import array
+from collections import Counter, OrderedDict
+from typing import Callable, Optional, Sequence
+
+import urwid
+
+
+class Speculator(object):
+    """Computes the results of ``query + character`` for the likely next characters.
+
+    ``filter_words(query, indices)`` returns the indices of the lines
+    (among ``indices``) matching a words query, ``lines`` is the text it
+    searches. The work is scheduled as zero-delay alarms of ``loop``, which
+    only run when no input is waiting.
+    """
+
+    # characters speculated on per query
+    candidates = 4
+    # matching lines the character frequencies are taken from
+    sample_size = 1000
+    # lines filtered per slice of idle time
+    slice_size = 4096
+    # results kept, and the most line indices they may hold together
+    cache_size = 16
+    max_indices = 1 << 22
+
+    def __init__(self, loop: urwid.MainLoop, filter_words: Callable[[str, Sequence[int]], list[int]],
+                 lines: Sequence[str]) -> None:
+        self.loop = loop
+        self.filter_words = filter_words
+        self.lines = lines
+        # results by (query, case sensitive), the query casefolded unless case sensitive
+        self.cache: OrderedDict[tuple[str, bool], array] = OrderedDict()
+        self.hits = 0
+        self._size = 0
+        # the work left: query, case, the lines it matches, the characters to
+        # try, and the lines found for the first of them so far
+        self._job: Optional[tuple[str, bool, Sequence[int], list[str], list[int]]] = None
+        self._position = 0
+        self._alarm = None
+
+    @staticmethod
+    def key(query: str, case_sensitive: bool) -> tuple[str, bool]:
+        return (query if case_sensitive else query.casefold(), case_sensitive)
+
+    def take(self, query: str, case_sensitive: bool) -> Optional[array]:
+        """Return the precomputed result of ``query``, None if there is none."""
+        found = self.cache.get(self.key(query, case_sensitive))
+        if found is not None:
+            self.cache.move_to_end(self.key(query, case_sensitive))
+            self.hits += 1
+        return found
+
+    def next_characters(self, query: str, case_sensitive: bool, matched: Sequence[int]) -> list[str]:
+        """Return the most likely characters to follow ``query``, most likely first."""
+        step = max(1, len(matched) // self.sample_size)
+        sample = [self.lines[i] for i in matched[::step][:self.sample_size]]
+        if not case_sensitive:
+            sample = [line.casefold() for line in sample]
+        word = query.split()[-1] if query.split() else ''
+        if not case_sensitive:
+            word = word.casefold()
+
+        counts: Counter = Counter()
+        for line in sample:
+            if not word:
+                counts.update(set(line))
+                continue
+            following = set()
+            position = line.find(word)
+            while position >= 0 and position + len(word) < len(line):
+                following.add(line[position + len(word)])
+                position = line.find(word, position + 1)
+            counts.update(following)
+        return [char for char, _ in counts.most_common()
+                if char not in string.whitespace][:self.candidates]
+
+    def start(self, query: str, case_sensitive: bool, matched: Sequence[int]) -> None:
+        """Speculate on the keys following ``query`` (a words query matching the lines at ``matched``)."""
+        self.cancel()
+        if not matched or len(matched) * self.candidates > self.max_indices:
+            return  # nothing to narrow, or too much to keep
+        characters = [char for char in self.next_characters(query, case_sensitive, matched)
+                      if self.key(query + char, case_sensitive) not in self.cache]
+        if characters:
+            self._job = (query, case_sensitive, matched, characters, [])
+            self._position = 0
+            self.resume()
+
+    def cancel(self) -> None:
+        """Drop the work left."""
+        self.pause()
+        self._job = None
+
+    def pause(self) -> None:
+        """Hold off the work, keys are being processed."""
+        if self._alarm is not None:
+            self.loop.remove_alarm(self._alarm)
+            self._alarm = None
+
+    def resume(self) -> None:
+        """Continue the work once the loop is idle."""
+        if self._job is not None and self._alarm is None:
+            self._alarm = self.loop.set_alarm_in(0, self._on_alarm)
+
+    def clear(self) -> None:
+        """Forget all results, the lines changed."""
+        self.cancel()
+        self.cache.clear()
+        self._size = 0
+
+    def _on_alarm(self, *_) -> None:
+        self._alarm = None
+        if self.step():
+            self.resume()
+
+    def step(self) -> bool:
+        """Filter one slice of lines; return whether there's work left."""
+        if self._job is None:
+            return False
+        query, case_sensitive, matched, characters, found = self._job
+        position = self._position
+        found.extend(self.filter_words(query + characters[0], matched[position:position + self.slice_size]))
+        self._position = position + self.slice_size
+        if self._position < len(matched):
+            return True
+
+        self.store(self.key(query + characters[0], case_sensitive), array('i', found))
+        if len(characters) == 1:
+            self._job = None
+            return False
+        self._job = (query, case_sensitive, matched, characters[1:], [])
+        self._position = 0
+        return True
+
+    def store(self, key: tuple[str, bool], found: array) -> None:
+        """Cache a result, evicting the least recently used ones beyond the limits."""
+        if len(found) > self.max_indices:
+            return
+        self.cache[key] = found
+        self._size += len(found)
+        while len(self.cache) > self.cache_size or self._size > self.max_indices:
+            _, evicted = self.cache.popitem(last=False)
+            self._size -= len(evicted)
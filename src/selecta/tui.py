@@ -0,0 +1,1476 @@
+"""The terminal UI: the list, the search field and the command line."""
+
+import asyncio
+import bisect
+import codecs
+import fcntl
+import functools
+import io
+from io import TextIOWrapper
+import os
+import re
+import signal
+import struct
+import sys
+import termios
+import time
+from typing import Callable, Optional, Sequence, Union
+
+import urwid
+
+from . import __version__
+from .aho_corasick import AhoCorasick
+from .fields import FieldLines, FieldRange, field_ranges
+from .engine import SearchEngine
+from .follow import Follower
+from .history import HistoryLog, current_directory, default_log_path
+from .index import IndexManager
+from .linesource import MappedLines, is_regular_file
+from .regex_guard import exponential_reason
+from .rowcache import RowCache
+from .speculate import Speculator
+
+
+def inject_command(command: str) -> None:
+    """Inject the line into the terminal using TIOCSTI (legacy, disabled on Linux 6.2+)."""
+    fd = sys.stdin.fileno()
+    try:
+        for c in (struct.pack('B', c) for c in os.fsencode(command)):
+            fcntl.ioctl(fd, termios.TIOCSTI, c)
+    except Exception as e:
+        print(
+            f'Error injecting command: {e}.\n'
+            'TIOCSTI is disabled on modern Linux kernels (6.2+).\n'
+            'Use --print (-p) mode with the shell wrapper function instead.\n'
+            'See https://github.com/vindolin/selecta for updated setup instructions.',
+            file=sys.stderr,
+        )
+
+def debug(value, prefix: str = '') -> None:
+    """only usded when debugging"""
+    return
+    with codecs.open('/tmp/selecta.log', 'a', encoding='utf-8') as file:
+        file.write(f'{prefix} {value}\n')
+
+
+palette: list[tuple[str, str, str, str, str, str]] = [
+    ('head', '', '', '', '#bbb', '#618'),
+    ('body', '', '', '', '#ddd', '#000'),
+    ('focus', '', '', '', '#000', '#da0'),
+    ('input', '', '', '', '#fff', '#618'),
+    ('empty_list', '', '', '', '#ddd', '#b00'),
+    ('match', '', '', '', '#f91', ''),
+    ('match_focus', '', '', '', 'bold,#a00', '#da0'),
+    ('line', '', '', '', '', ''),
+    ('line_focus', '', '', '', '#000', '#da0'),
+]
+
+
+class ItemWidget(urwid.WidgetWrap):
+    """Base for a widget for a single line in the listbox.
+
+    The ItemWalker sets ``index``, the index of the line, and ``row_cache``.
+    The rendered row is then kept in the cache by the line, its highlighted
+    parts (``spans``), the size and the focus, and the next widget of the
+    line that looks the same draws it from there.
+    """
+    index: Optional[int] = None
+    row_cache: Optional[RowCache] = None
+
+    def selectable(self) -> bool:
+        return True
+
+    def keypress(self, _, key: str) -> str:
+        return key
+
+    def spans(self) -> tuple[tuple[int, int], ...]:
+        """Return the (start, end) of the highlighted parts of the line."""
+        return ()
+
+    def row_key(self, size, focus: bool) -> Optional[tuple]:
+        """Return the key of the row in the row cache, None if it isn't cached."""
+        if self.row_cache is None or self.index is None:
+            return None
+        return (type(self), self.index, self.spans(), size, focus)
+
+    def rows(self, size, focus=False) -> int:
+        key = self.row_key(size, focus)
+        canvas = self.row_cache.get(key) if key is not None else None
+        if canvas is not None:
+            return canvas.rows()
+        return super().rows(size, focus)
+
+    def render(self, size, focus=False):
+        key = self.row_key(size, focus)
+        canvas = self.row_cache.get(key) if key is not None else None
+        if canvas is None:
+            canvas = self.render_row(size, focus)
+            if key is not None:
+                self.row_cache.put(key, canvas)
+        return canvas
+
+    def render_row(self, size, focus=False):
+        """Render the row, it isn't in the row cache."""
+        return super().render(size, focus)
+
+
+class ItemWidgetPlain(ItemWidget):
+    """Widget that displays a line as is."""
+    def __init__(self, line: str) -> None:
+        self.line = line
+        text = urwid.AttrMap(urwid.Text(self.line), 'line', 'line_focus')
+        super().__init__(text)
+
+
+class ItemWidgetMarked(ItemWidget):
+    """Base for widgets that highlight the parts of a line ``find_spans`` returns.
+
+    The line is rendered as-is until the widget is actually drawn; only then
+    is it split and highlighted. Since urwid only renders the visible rows,
+    lines that are never shown never pay the split cost.
+    """
+    def __init__(self, line: str) -> None:
+        self.line = line
+        self._spans: Optional[tuple[tuple[int, int], ...]] = None
+
+        # start with the plain line so layout/rows are correct before decoration
+        self._text = urwid.Text(line)
+        self._decorated = False
+        text = urwid.AttrMap(self._text, 'line', {'match': 'match_focus', None: 'line_focus'})
+        super().__init__(text)
+
+    def find_spans(self) -> list[tuple[int, int]]:
+        raise NotImplementedError
+
+    def spans(self) -> tuple[tuple[int, int], ...]:
+        if self._spans is None:
+            self._spans = tuple(self.find_spans())
+        return self._spans
+
+    def render_row(self, size, focus=False):
+        if not self._decorated:
+            self._decorated = True
+            if self.spans():
+                self._text.set_text(split_parts(self.line, self.spans()))
+        return super().render_row(size, focus)
+
+
+class ItemWidgetLiteral(ItemWidgetMarked):
+    """Widget that highlights the literal search string in a line."""
+    def __init__(self, line: str, search_text: str) -> None:
+        self.search_text = search_text
+        super().__init__(line)
+
+    def find_spans(self) -> list[tuple[int, int]]:
+        return [match.span() for match in re.finditer(re.escape(self.search_text), self.line)
+                if match.end() > match.start()]
+
+
+class ItemWidgetPattern(ItemWidgetLiteral):
+    """Widget that highlights the matching part of a line (wherever it occurs)."""
+    def __init__(self, line: str, match: str) -> None:
+        super().__init__(line, match)
+
+
+def match_spans(subject_string: str, matcher: AhoCorasick, case_sensitive: bool) -> list[tuple[int, int]]:
+    """Return the (start, end) of the parts of the subject the words of ``matcher`` cover.
+
+    ``matcher`` is built from the casefolded words unless ``case_sensitive``.
+    """
+    if case_sensitive or subject_string.isascii():
+        return matcher.spans(subject_string if case_sensitive else subject_string.lower())
+    folded = subject_string.casefold()
+    if len(folded) == len(subject_string):
+        return matcher.spans(folded)  # every character folded to one, the spans are the same
+
+    # casefolding changed the length of the line ('ß' -> 'ss'), map
+    # the spans in the folded line back to the characters they came from
+    folded_chars = [char.casefold() for char in subject_string]
+    origin = [i for i, folded in enumerate(folded_chars) for _ in folded]
+    spans: list[tuple[int, int]] = []
+    for start, end in matcher.spans(''.join(folded_chars)):
+        start, end = origin[start], origin[end - 1] + 1
+        if spans and start <= spans[-1][1]:
+            start = spans.pop()[0]
+        spans.append((start, end))
+    return spans
+
+
+def mark_parts(subject_string: str, s_words: list[str], case_sensitive: bool,
+               highlight_matches: bool, matcher: Optional[AhoCorasick] = None) -> list[Union[str, tuple]]:
+    """Split the subject on the search words, marking the matching parts.
+
+    ``matcher`` is an optional automaton for ``s_words`` (casefolded unless
+    ``case_sensitive``); when given it is reused instead of building it here
+    (the caller can build it once per keystroke rather than once per line).
+    """
+    if matcher is None:
+        matcher = AhoCorasick(s_words if case_sensitive else [s_word.casefold() for s_word in s_words])
+    return split_parts(subject_string, match_spans(subject_string, matcher, case_sensitive), highlight_matches)
+
+
+def pattern_spans(pattern: re.Pattern) -> Callable[[str], list[tuple[int, int]]]:
+    """Return a function finding the (start, end) of the non-empty matches of ``pattern`` in a text."""
+    def find_spans(text: str) -> list[tuple[int, int]]:
+        return [match.span() for match in pattern.finditer(text) if match.end() > match.start()]
+    return find_spans
+
+
+def split_parts(subject_string: str, spans: Sequence[tuple[int, int]],
+                highlight_matches: bool = True) -> list[Union[str, tuple]]:
+    """Split the subject at the (ordered, non-overlapping) spans, marking them as matches."""
+    l_parts: list[Union[str, tuple]] = []
+    position = 0
+    for start, end in spans:
+        if start > position:
+            l_parts.append(subject_string[position:start])
+        part = subject_string[start:end]
+        l_parts.append(('match', part) if highlight_matches else part)
+        position = end
+    if position < len(subject_string):
+        l_parts.append(subject_string[position:])
+
+    return l_parts
+
+
+class ItemWidgetWords(ItemWidgetMarked):
+    """Widget that highlights the matching words of a line."""
+    def __init__(self, line: str, search_words: list[str], case_modifier: bool,
+                 highlight_matches: bool, matcher: Optional[AhoCorasick] = None) -> None:
+        self.search_words = search_words
+        self.case_modifier = case_modifier
+        self.highlight_matches = highlight_matches
+        self.matcher = matcher
+        super().__init__(line)
+
+    def find_spans(self) -> list[tuple[int, int]]:
+        if not self.highlight_matches:
+            return []
+        if self.matcher is None:
+            self.matcher = AhoCorasick(self.search_words if self.case_modifier
+                                       else [word.casefold() for word in self.search_words])
+        return match_spans(self.line, self.matcher, self.case_modifier)
+
+
+class ItemWidgetFields(ItemWidget):
+    """Widget that shows some fields of a line, highlighting the matches in the searched ones.
+
+    ``shown`` are the (start, end) of the parts of the line that are shown,
+    joined with ``separator``, ``marked`` those of the matches. The whole
+    line is still what gets selected.
+    """
+    def __init__(self, line: str, shown: list[tuple[int, int]], marked: list[tuple[int, int]],
+                 separator: str) -> None:
+        self.line = line
+        marked = sorted(marked)
+        self.marked = tuple(marked)
+
+        parts: list[Union[str, tuple[str, str]]] = []
+        for n, (start, end) in enumerate(shown):
+            if n:
+                parts.append(separator)
+            position = start
+            for mark_start, mark_end in marked:
+                mark_start, mark_end = max(mark_start, position), min(mark_end, end)
+                if mark_start >= mark_end:
+                    continue
+                if mark_start > position:
+                    parts.append(line[position:mark_start])
+                parts.append(('match', line[mark_start:mark_end]))
+                position = mark_end
+            if position < end:
+                parts.append(line[position:end])
+
+        self._text = urwid.Text(parts or '')
+        text = urwid.AttrMap(self._text, 'line', {'match': 'match_focus', None: 'line_focus'})
+        super().__init__(text)
+
+    def spans(self) -> tuple[tuple[int, int], ...]:
+        return self.marked  # the shown fields of a line are always the same
+
+
+class ItemWidgetClipped(ItemWidget):
+    """Widget that shows a line as a single row, clipped around the first match.
+
+    Only the visible slice of the line is handed to ``urwid.Text`` and
+    highlighted, so the cost of a row depends on the terminal width instead
+    of the length of the line. ``find_spans`` returns the (start, end) of
+    the matches in the line (None: no search), ``scroll`` the horizontal
+    scroll offset shared by all rows.
+    """
+    def __init__(self, line: str, find_spans: Optional[Callable[[str], list[tuple[int, int]]]],
+                 highlight_matches: bool, scroll: Callable[[], int]) -> None:
+        self.line = line
+        self.find_spans = find_spans
+        self.highlight_matches = highlight_matches
+        self.scroll = scroll
+        self._spans: Optional[tuple[tuple[int, int], ...]] = None
+        self._layout: Optional[tuple[int, int]] = None
+
+        self._text = urwid.Text('', wrap='clip')
+        text = urwid.AttrMap(self._text, 'line', {'match': 'match_focus', None: 'line_focus'})
+        super().__init__(text)
+
+    def rows(self, size, focus=False) -> int:
+        return 1
+
+    def row_key(self, size, focus: bool) -> Optional[tuple]:
+        return None  # the row depends on the scroll offset, and keeps its own layout
+
+    def spans(self) -> tuple[tuple[int, int], ...]:
+        if self._spans is None:
+            self._spans = tuple(self.find_spans(self.line)) if self.find_spans is not None else ()
+        return self._spans
+
+    def anchor(self) -> tuple[int, int]:
+        """Return the (start, end) of the first match, (0, 0) if there's none."""
+        spans = self.spans()
+        return spans[0] if spans else (0, 0)
+
+    def visible_start(self, maxcol: int) -> int:
+        """Return the index of the first visible character for a row ``maxcol`` wide."""
+        start, end = self.anchor()
+        # keep the line start in view if the match fits, else give the match some left context
+        offset = 0 if end <= maxcol else start - maxcol // 4
+        return max(0, min(offset + self.scroll(), len(self.line) - 1))
+
+    def render(self, size, focus=False):
+        maxcol = size[0]
+        start = self.visible_start(maxcol)
+        if self._layout != (maxcol, start):
+            self._layout = (maxcol, start)
+            visible = self.line[start:start + maxcol]
+            if self.highlight_matches and self.spans():
+                # the matches found in the whole line, cut to the visible part
+                stop = start + maxcol
+                spans = [(max(begin, start) - start, min(end, stop) - start)
+                         for begin, end in self.spans() if begin < stop and end > start]
+                self._text.set_text(split_parts(visible, spans) or '')
+            else:
+                self._text.set_text(visible)
+        return super().render((maxcol,), focus)
+
+
+class SearchEdit(urwid.Edit):
+    """Edit widget for the search input."""
+
+    signals = ['done', 'toggle_regexp_modifier', 'toggle_case_modifier']
+
+    def keypress(self, size: tuple[int], key: str) -> None:
+        if key == 'enter':
+            urwid.emit_signal(self, 'done', self.get_edit_text())
+            return
+        elif key == 'esc':
+            raise urwid.ExitMainLoop()
+        elif key == 'ctrl a':
+            urwid.emit_signal(self, 'toggle_case_modifier')
+            urwid.emit_signal(self, 'change', self, self.get_edit_text())
+            return
+        elif key == 'ctrl r':
+            urwid.emit_signal(self, 'toggle_regexp_modifier')
+            urwid.emit_signal(self, 'change', self, self.get_edit_text())
+            return
+        elif key == 'down':
+            urwid.emit_signal(self, 'done', None)
+            return
+
+        urwid.Edit.keypress(self, size, key)
+
+
+class LineCountWidget(urwid.Text):
+    """Widget that displays the number of matching lines / total lines."""
+    def __init__(self, line_count: int = 0) -> None:
+        super().__init__('')
+        self.line_count = line_count
+        self.complete = True
+
+    def update(self, matching_line_count: int, line_count: Optional[int] = None,
+               complete: Optional[bool] = None) -> None:
+        """Update the widget with the current number of matching lines (and total lines).
+
+        ``complete`` tells whether all lines were searched; a partial count
+        is shown with a plus.
+        """
+        if line_count is not None:
+            self.line_count = line_count
+        if complete is not None:
+            self.complete = complete
+        self.set_text(f'{matching_line_count}{"" if self.complete else "+"}/{self.line_count}')
+
+
+def help_text() -> str:
+    """Return the text shown on the F1 help screen."""
+    return (
+        f'selecta v{__version__}\n'
+        '\n'
+        'Keyboard shortcuts:\n'
+        '  enter           select the highlighted line\n'
+        '  up / down       move through the list\n'
+        '  left / right    scroll clipped lines (--clip-lines)\n'
+        '  ctrl+a          toggle case sensitivity\n'
+        '  ctrl+r          toggle regexp search\n'
+        '  backspace       delete the last character\n'
+        '  esc             back to the search box (quit from the search box)\n'
+        '  f1              show/hide this help\n'
+        '\n'
+        'Press f1, esc or q to close.'
+    )
+
+
+class HelpBox(urwid.WidgetWrap):
+    """Selectable help screen; consumes all keys except the close keys."""
+
+    signals = ['close']
+
+    def __init__(self, text: str) -> None:
+        lines = [urwid.Text(line) for line in text.splitlines()]
+        box = urwid.AttrMap(urwid.LineBox(urwid.Pile(lines)), 'head')
+        super().__init__(box)
+
+    def selectable(self) -> bool:
+        return True
+
+    def keypress(self, size, key: str):
+        if key in ('f1', 'esc', 'q'):
+            urwid.emit_signal(self, 'close')
+        return None  # consume all keys while the help screen is shown
+
+
+def make_screen(output=None) -> urwid.BaseScreen:
+    """Create the raw terminal screen, with bracketed paste enabled where urwid supports it."""
+    kwargs = {'output': output} if output is not None else {}
+    try:
+        return urwid.raw_display.Screen(bracketed_paste_mode=True, **kwargs)
+    except TypeError:  # urwid < 2.6 doesn't know about bracketed paste
+        return urwid.raw_display.Screen(**kwargs)
+
+
+class ItemWalker(urwid.ListWalker):
+    """List walker over the indices of the matching lines; widgets are created on demand.
+
+    Only the rows urwid actually displays get a widget, so a result of a
+    million lines costs a sequence of a million ints rather than a million
+    widgets. Without matches a single message widget is shown instead.
+    """
+
+    # widgets kept per position, so rows that stay on screen keep their canvases
+    cache_size = 2048
+
+    def __init__(self) -> None:
+        self.indices: Sequence[int] = ()
+        self.make_item: Optional[Callable[[int], ItemWidget]] = None
+        self.message: Optional[urwid.Widget] = None
+        self.focus = 0
+        self._items: dict[int, urwid.Widget] = {}
+        # rendered rows by line, shared with the widgets of the next updates
+        self.row_cache = RowCache()
+
+    def set_items(self, indices: Sequence[int], make_item: Callable[[int], ItemWidget],
+                  focus: int = 0) -> None:
+        """Show the lines at ``indices``, ``make_item`` creates the widget of a line index."""
+        self.indices = indices
+        self.make_item = make_item
+        self.message = None
+        self._items = {}
+        self.focus = max(0, min(focus, len(indices) - 1))
+        self._modified()
+
+    def set_message(self, message: urwid.Widget) -> None:
+        """Show ``message`` instead of any lines."""
+        self.indices = ()
+        self.message = message
+        self._items = {}
+        self.focus = 0
+        self._modified()
+
+    def extend_indices(self, indices: Sequence[int]) -> None:
+        """Replace the indices with a longer sequence that starts with the same ones."""
+        self.indices = indices
+        self._modified()
+
+    def __len__(self) -> int:
+        return 1 if self.message is not None else len(self.indices)
+
+    def __getitem__(self, position: int) -> urwid.Widget:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('position out of range')
+        if self.message is not None:
+            return self.message
+
+        item = self._items.get(position)
+        if item is None:
+            if len(self._items) >= self.cache_size:
+                self._items.clear()
+            item = self._items[position] = self.make_item(self.indices[position])
+            item.index = self.indices[position]
+            item.row_cache = self.row_cache
+        return item
+
+    def __iter__(self):
+        return (self[position] for position in range(len(self)))
+
+    def next_position(self, position: int) -> int:
+        if position + 1 >= len(self):
+            raise IndexError('no next position')
+        return position + 1
+
+    def prev_position(self, position: int) -> int:
+        if position <= 0:
+            raise IndexError('no previous position')
+        return position - 1
+
+    def set_focus(self, position: int) -> None:
+        self.focus = position
+        self._modified()
+
+
+class SelectaLoop(urwid.MainLoop):
+    """MainLoop that caps the redraw rate and reports the end of each input batch.
+
+    Redraws closer together than ``1 / max_fps`` seconds are postponed to a
+    single redraw at the start of the next frame. ``input_done`` is called
+    after every batch of keys read from the terminal, so changes triggered by
+    the individual keys can be applied once per batch. ``first_draw`` is
+    called once the first frame is on screen.
+
+    While ``exit_future`` is set (the loop runs on an asyncio loop it doesn't
+    own), leaving the loop resolves it instead of raising into that loop.
+    """
+
+    def __init__(self, *args, max_fps: float = 60.0,
+                 input_done: Optional[Callable[[], None]] = None,
+                 first_draw: Optional[Callable[[], None]] = None, **kwargs) -> None:
+        self.frame_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.input_done = input_done
+        self.first_draw = first_draw
+        self.exit_future: Optional[asyncio.Future] = None
+        self.processing_input = False
+        self._last_draw = 0.0
+        self._draw_alarm = None
+        super().__init__(*args, **kwargs)
+
+    def process_input(self, keys) -> bool:
+        self.processing_input = True
+        try:
+            return super().process_input(keys)
+        except urwid.ExitMainLoop:
+            if self.exit_future is None:
+                raise
+            if not self.exit_future.done():
+                self.exit_future.set_result(None)
+            return True
+        except Exception as error:
+            if self.exit_future is None:
+                raise
+            if not self.exit_future.done():
+                self.exit_future.set_exception(error)
+            return True
+        finally:
+            self.processing_input = False
+            if self.input_done is not None:
+                self.input_done()
+
+    def draw_screen(self) -> None:
+        now = time.monotonic()
+        wait = self._last_draw + self.frame_interval - now
+        if wait > 0:
+            # the loop redraws when it enters idle after the alarm fired
+            if self._draw_alarm is None:
+                self._draw_alarm = self.set_alarm_in(wait, self._frame_due)
+            return
+
+        self._last_draw = now
+        super().draw_screen()
+
+        if self.first_draw is not None:
+            first_draw, self.first_draw = self.first_draw, None
+            first_draw()
+
+    def _frame_due(self, *_) -> None:
+        self._draw_alarm = None
+
+
+class Selecta(object):
+    """The main class of Selecta."""
+
+    lines: Sequence[str] = []
+
+    def __init__(self, infile: TextIOWrapper, reverse_order: bool,
+                 bash_mode: bool = False, zsh_mode: bool = False,
+                 case_sensitive: bool = False, regexp: bool = False,
+                 remove_duplicates: bool = False, highlight_matches: bool = False,
+                 test_mode: bool = False,
+                 screen: Optional[urwid.BaseScreen] = None,
+                 initial_query: str = '',
+                 directory_lines: Optional[Sequence[str]] = None,
+                 directory_only: bool = False,
+                 max_fps: float = 60.0,
+                 clip_lines: bool = False,
+                 follow: bool = False,
+                 max_lines: int = 0,
+                 build_index: bool = True,
+                 regex_budget: float = 0.25,
+                 delimiter: Optional[str] = None,
+                 nth: Optional[list[FieldRange]] = None,
+                 with_nth: Optional[list[FieldRange]] = None,
+                 event_loop: Optional[urwid.EventLoop] = None) -> None:
+
+        self.highlight_matches = highlight_matches
+        self.regexp_modifier = regexp
+        self.case_modifier = case_sensitive
+        self.regexp_modifier = regexp
+        # one row per line, clipped around the first match and scrolled with left/right
+        self.clip_lines = clip_lines
+        self.hscroll = 0
+
+        # with --follow, keep at most max_lines lines (0: no limit)
+        self.max_lines = max_lines
+
+        # whether the shown regexp ran out of the engine's regex budget
+        self.regex_too_slow = False
+
+        if follow and not is_regular_file(infile):
+            self.lines = []  # a pipe may never reach EOF, everything arrives through the follower
+        elif (not (follow or reverse_order or bash_mode or zsh_mode or remove_duplicates)
+                and directory_lines is None and not (nth or with_nth) and MappedLines.usable(infile)):
+            # plain regular file: map it instead of reading it, lines are decoded when shown
+            self.lines = MappedLines(infile)
+        else:
+            self.lines = self.parse_lines(infile, reverse_order, bash_mode, zsh_mode, remove_duplicates)
+        if directory_lines is not None:
+            self.lines = self.merge_directory_lines(self.lines, directory_lines, directory_only)
+
+        # the searches, on the lines (or with --nth the chosen fields of them);
+        # regexp searches may take regex_budget seconds per keystroke
+        self.engine = SearchEngine(self.lines, delimiter, nth, regex_budget)
+        self.search_fields = self.engine.search_fields
+        # with --with-nth only the chosen fields are shown
+        self.display_fields = FieldLines(self.lines, with_nth, delimiter) if with_nth else None
+        self.matching_line_count = len(self.lines)
+        # indices of the lines the list shows, and the factory of their widgets
+        self.matched: Sequence[int] = range(len(self.lines))
+        self._make_item: Optional[Callable[[int], ItemWidget]] = None
+
+        # cache of the last words-mode filter, used to narrow the scan while typing
+        self._filter_cache = None
+        # the line selected when the user presses enter (None if cancelled)
+        self.selected: Optional[str] = None
+
+        # query changes are collected and applied at most once per frame
+        self._pending_query: Optional[str] = None
+        self._last_update = 0.0
+        self._update_alarm = None
+        # the (query, case, regexp) state the list currently shows
+        self._shown: Optional[tuple[str, bool, bool]] = None
+        # text of a bracketed paste in progress
+        self._paste: Optional[list[str]] = None
+
+        self.search_edit = SearchEdit(edit_text=initial_query)
+        self.modifier_display = urwid.Text('')
+        self.index_display = urwid.Text('')
+        self.line_count_display = LineCountWidget(self.matching_line_count)
+        header = urwid.AttrMap(urwid.Columns([
+            urwid.AttrMap(self.search_edit, 'input', 'input'),
+            self.modifier_display,
+            ('pack', self.index_display),
+            ('pack', self.line_count_display),
+        ], dividechars=1, focus_column=0), 'head', 'head')
+
+        self.item_list = ItemWalker()
+        self.listbox = urwid.ListBox(self.item_list)
+        self.view = urwid.Frame(body=self.listbox, header=header)
+
+        # F1 help screen (replaces the list body while shown)
+        self.help_shown = False
+        self.help_box = HelpBox(help_text())
+        urwid.connect_signal(self.help_box, 'close', self._hide_help)
+
+        urwid.connect_signal(self.search_edit, 'change', self.edit_change)
+        urwid.connect_signal(self.search_edit, 'done', self.edit_done)
+
+        urwid.connect_signal(self.search_edit, 'toggle_case_modifier',
+                             lambda *_: self.toggle_modifier('case_modifier'))
+        urwid.connect_signal(self.search_edit, 'toggle_regexp_modifier',
+                             lambda *_: self.toggle_modifier('regexp_modifier'))
+
+        self.update_modifiers()
+        if screen is None:
+            screen = make_screen()
+
+        self.loop = SelectaLoop(self.view, palette, screen=screen,
+                                unhandled_input=self.on_unhandled_input,
+                                input_filter=self.on_input_filter,
+                                input_done=self.on_input_done,
+                                max_fps=max_fps,
+                                event_loop=event_loop)
+
+        # under run_async, words searches scanning more lines than this run
+        # in the default executor, the asyncio loop keeps serving its tasks
+        self.executor_lines = 100_000
+        self._async = False
+        self._filter_task: Optional[asyncio.Task] = None
+        # a words query typed while the executor was busy, searched next
+        self._waiting_query: Optional[str] = None
+
+        # the trigram index is built in the background once the first frame
+        # is drawn, searches scan the lines until then (mapped files are
+        # searched as bytes and don't need it)
+        self.indexer: Optional[IndexManager] = None
+        if build_index and not self.engine.mapped:
+            self.indexer = IndexManager(self.loop, self.engine, on_change=self.update_index_display)
+            self.loop.first_draw = self.start_indexer
+
+        # results of the likely next keys, computed while the loop is idle
+        self.speculator = Speculator(self.loop, self.filter_words, self.engine.search_lines)
+
+        # find out what this pylint error means (happens from >=2.2.0)
+        # Cannot access member "set_terminal_properties"
+        # for type "BaseScreen" Member "set_terminal_properties" is unknown
+        # it doesn't seem to be a problem though
+        self.loop.screen.set_terminal_properties(colors=256)  # type: ignore - make pylance happy
+        # self.loop.screen.set_terminal_properties(colors=2**24)
+
+        self.update_list(initial_query)
+
+        self.follower: Optional[Follower] = None
+        if follow:
+            self.follower = Follower(self.loop, infile, self.append_lines)
+            self.follower.start()
+
+    def run(self) -> Optional[str]:
+        """Run the UI loop and return the selected line, or None if cancelled."""
+        try:
+            self.loop.run()
+        finally:
+            self.stop_background()
+        return self.selected
+
+    async def run_async(self) -> Optional[str]:
+        """Run the UI on the running asyncio loop and return the selected line, or None if cancelled.
+
+        Selecta has to be created with an event loop of that asyncio loop,
+        ``event_loop=urwid.AsyncioEventLoop(loop=asyncio.get_running_loop())``.
+        Input, the follower, the index and the timers are callbacks of the
+        loop, and long words searches run in its default executor, so the
+        caller's other tasks keep running while the user picks a line.
+        """
+        if not isinstance(self.loop.event_loop, urwid.AsyncioEventLoop):
+            raise RuntimeError('run_async() needs a Selecta created with an urwid.AsyncioEventLoop')
+
+        self.loop.exit_future = asyncio.get_running_loop().create_future()
+        self._async = True
+        try:
+            with self.loop.start():
+                self.loop.draw_screen()  # asyncio loops only draw after a callback
+                await self.loop.exit_future
+        finally:
+            self._async = False
+            self.loop.exit_future = None
+            self.stop_background()
+        return self.selected
+
+    def stop_background(self) -> None:
+        """Stop the work the loop would go on doing: the follower, the index build, timers and searches."""
+        if self.follower is not None:
+            self.follower.stop()
+        if self.indexer is not None:
+            self.indexer.stop()
+        self.speculator.cancel()
+        if self._update_alarm is not None:
+            self.loop.remove_alarm(self._update_alarm)
+            self._update_alarm = None
+        if self._filter_task is not None:
+            self._filter_task.cancel()
+            self._filter_task = None
+        self._waiting_query = None
+
+    def start_indexer(self) -> None:
+        self.indexer.start()
+        self.update_index_display()
+
+    def update_index_display(self) -> None:
+        """Show the progress of the index build in the header."""
+        if self.indexer is not None and self.indexer.building:
+            self.index_display.set_text(f'indexing {self.indexer.progress:.0%}')
+        else:
+            self.index_display.set_text('')
+
+    def parse_lines(self, infile: TextIOWrapper, reverse_order: bool,
+                    remove_bash_prefix: bool, remove_zsh_prefix: bool, remove_duplicates: bool) -> list[str]:
+        """Get the lines from the infile."""
+
+        lines: list[str] = []
+        if reverse_order:
+            lines_ = reversed(infile.readlines())
+        else:
+            lines_ = infile
+
+        for line in lines_:
+            line = line.strip()
+            # remove bash/zsh line numbers from the beginning of the line
+            if remove_bash_prefix or remove_zsh_prefix:
+                try:
+                    line = line.split(None, 1)[1]
+                except IndexError:
+                    pass  # ignore lines without prefix
+
+            # zsh legacy line = re.split(r'\s+', line, maxsplit=4)[-1]
+
+            if remove_duplicates and line in lines:
+                continue
+
+            lines.append(line)
+
+        return lines
+    # [ItemWidgetPlain(line) for line in self.lines]
+
+    @staticmethod
+    def merge_directory_lines(lines: list[str], directory_lines: Sequence[str],
+                              directory_only: bool) -> list[str]:
+        """Put the commands from the directory history in front of the other lines.
+
+        ``directory_lines`` is expected newest first; duplicates are dropped.
+        With ``directory_only`` the other lines are discarded.
+        """
+        merged = list(dict.fromkeys(line.strip() for line in directory_lines))
+        if directory_only:
+            return merged
+
+        seen = set(merged)
+        return merged + [line for line in lines if line not in seen]
+
+    def update_item_list(self, matched: Sequence[int], make_item: Optional[Callable[[int], ItemWidget]],
+                         message: str = '- empty result -', complete: bool = True) -> None:
+        """Show the lines at the indices in ``matched``.
+
+        The widgets are created by ``make_item`` when urwid displays them;
+        ``message`` is shown in place of the list when nothing matched.
+        ``complete`` is False when the search stopped before the last line.
+        """
+        self.matched = matched
+        self._make_item = make_item
+        if len(matched) > 0:
+            self.item_list.set_items(matched, make_item)
+        else:
+            self.item_list.set_message(urwid.Text(('empty_list', message)))
+        self.matching_line_count = len(matched)
+        self.line_count_display.update(self.matching_line_count, complete=complete)
+
+    def toggle_modifier(self, modifier: str) -> None:
+        self.speculator.cancel()
+        setattr(self, modifier, not getattr(self, modifier))
+        self.update_modifiers()
+
+    def update_modifiers(self) -> None:
+        """Update the modifier display"""
+        modifiers: set[str] = set()
+        if self.regexp_modifier:
+            modifiers.add('regexp')
+        if self.case_modifier:
+            modifiers.add('case')
+        if self.regexp_modifier and self.regex_too_slow:
+            modifiers.add('too slow')
+
+        if len(modifiers) > 0:
+            self.modifier_display.set_text(f'[{", ".join(modifiers)}]')
+        else:
+            self.modifier_display.set_text('')
+
+    def _show_help(self) -> None:
+        self.view.body = self.help_box
+        self.help_shown = True
+        self.view.focus_position = 'body'
+
+    def _hide_help(self) -> None:
+        self.view.body = self.listbox
+        self.help_shown = False
+        self.view.focus_position = 'body'
+
+    def toggle_help(self) -> None:
+        """Show/hide the F1 help screen."""
+        if self.help_shown:
+            self._hide_help()
+        else:
+            self._show_help()
+
+    def item_plain(self, line: str) -> ItemWidget:
+        """Return the widget for a line shown without a search."""
+        if self.clip_lines:
+            return ItemWidgetClipped(line, None, False, lambda: self.hscroll)
+        return ItemWidgetPlain(line)
+
+    def item_clipped(self, line: str, find_spans: Callable[[str], list[tuple[int, int]]]) -> ItemWidget:
+        """Return the clipped row for a line, anchored at the first match ``find_spans`` finds."""
+        return ItemWidgetClipped(line, find_spans, self.highlight_matches, lambda: self.hscroll)
+
+    def scroll_lines(self, columns: int) -> None:
+        """Scroll the clipped lines horizontally."""
+        self.hscroll += columns
+        # the rows render a different slice now, drop their cached canvases
+        urwid.CanvasCache.clear()
+        self.listbox._invalidate()
+
+    def item_factory(self, search_text: str) -> Callable[[int], ItemWidget]:
+        """Return a function creating the widget of a matching line for ``search_text``.
+
+        Whatever only depends on the query (patterns, automaton) is prepared
+        here once instead of once per line. Raises ``re.error`` for an invalid
+        regular expression.
+        """
+        lines = self.lines
+        if self.display_fields is not None or (self.search_fields is not None and self.highlight_matches):
+            return self.field_item_factory(search_text)
+
+        if search_text == '' or search_text == '"' or search_text == '""':
+            return lambda i: self.item_plain(lines[i])
+
+        if search_text.startswith('"'):
+            literal = search_text.strip('"')
+            if self.clip_lines:
+                find_literal = pattern_spans(re.compile(re.escape(literal)))
+                return lambda i: self.item_clipped(lines[i], find_literal)
+            if self.highlight_matches:
+                return lambda i: ItemWidgetLiteral(lines[i], literal)
+            return lambda i: ItemWidgetPlain(lines[i])
+
+        if self.regexp_modifier:
+            compiled = re.compile(search_text, re.IGNORECASE if not self.case_modifier else 0)
+            if self.clip_lines:
+                find_pattern = pattern_spans(compiled)
+                return lambda i: self.item_clipped(lines[i], find_pattern)
+            if self.highlight_matches:
+                return lambda i: ItemWidgetPattern(lines[i], compiled.search(lines[i]).group())
+            return lambda i: ItemWidgetPlain(lines[i])
+
+        words = search_text.split()
+        if self.clip_lines:
+            # the same casefolded matching as the search ('strasse' finds 'Straße')
+            find_words = functools.partial(match_spans, matcher=self.word_matcher(words),
+                                           case_sensitive=self.case_modifier)
+            return lambda i: self.item_clipped(lines[i], find_words)
+        if self.highlight_matches:
+            matcher = self.word_matcher(words)
+            return lambda i: ItemWidgetWords(lines[i], words, self.case_modifier, True, matcher)
+        # no highlighting needed: skip the split entirely
+        return lambda i: ItemWidgetPlain(lines[i])
+
+    def field_item_factory(self, search_text: str) -> Callable[[int], ItemWidget]:
+        """Return the widget factory for lines of which only some fields are searched or shown.
+
+        Matches are only highlighted in the searched fields. Raises
+        ``re.error`` for an invalid regular expression.
+        """
+        find_spans: Optional[Callable[[str], list[tuple[int, int]]]] = None
+        if self.highlight_matches and search_text not in ('', '"', '""'):
+            if search_text.startswith('"') or self.regexp_modifier:
+                if search_text.startswith('"'):
+                    compiled = re.compile(re.escape(search_text.strip('"')))
+                else:
+                    compiled = re.compile(search_text, re.IGNORECASE if not self.case_modifier else 0)
+                find_spans = pattern_spans(compiled)
+            else:
+                matcher = self.word_matcher(search_text.split())
+                case_sensitive = self.case_modifier
+
+                def find_words(text: str) -> list[tuple[int, int]]:
+                    return match_spans(text, matcher, case_sensitive)
+                find_spans = find_words
+
+        return lambda i: self.item_fields(i, find_spans)
+
+    def item_fields(self, i: int, find_spans: Optional[Callable[[str], list[tuple[int, int]]]]) -> ItemWidget:
+        """Return the widget of line ``i`` showing its fields, ``find_spans`` finds the matches in a field."""
+        line = self.lines[i]
+        whole = [(0, len(line))]
+        shown = self.display_fields.spans(i) if self.display_fields is not None else whole
+        marked: list[tuple[int, int]] = []
+        if find_spans is not None:
+            for start, end in self.search_fields.spans(i) if self.search_fields is not None else whole:
+                marked.extend((start + s, start + e) for s, e in find_spans(line[start:end]))
+        separator = self.display_fields.separator if self.display_fields is not None else ''
+        return ItemWidgetFields(line, shown, marked, separator)
+
+    def word_matcher(self, words: list[str]) -> AhoCorasick:
+        """Return the automaton for the search words (built once per query)."""
+        return self.engine.word_matcher(words, self.case_modifier)
+
+    def filter_regex(self, pattern: str, indices: Optional[Sequence[int]] = None) -> tuple[list[int], bool]:
+        """Return the indices of the lines matching a regular expression, see ``SearchEngine.filter_regex``."""
+        return self.engine.filter_regex(pattern, self.case_modifier, indices)
+
+    def filter_words(self, search_text: str, indices: Optional[Sequence[int]] = None) -> list[int]:
+        """Return the indices of the lines containing all words of ``search_text``.
+
+        ``indices`` optionally restricts the scan to a subset of line indices
+        (used to narrow the previous result while the query is being extended).
+        May run in the executor, so it doesn't take a finished index into use
+        (``update_list`` does).
+        """
+        return self.engine.filter_words(search_text, self.case_modifier, indices)
+
+    def filter_literal(self, search_text: str, indices: Optional[Sequence[int]] = None) -> list[int]:
+        """Return the indices of the lines starting with the quoted ``search_text``."""
+        search_text = search_text.strip('"')  # quote marks were only used to indicate literal search
+        return self.engine.filter_literal(search_text, True, indices)
+
+    def match_lines(self, search_text: str, indices: Sequence[int]) -> list[int]:
+        """Return the indices in ``indices`` of the lines that match ``search_text``."""
+        if search_text == '' or search_text == '"' or search_text == '""':
+            return list(indices)
+        elif search_text.startswith('"'):
+            return self.filter_literal(search_text, indices)
+        elif self.regexp_modifier:
+            if exponential_reason(search_text) is not None:
+                return []  # rejected, the list shows why
+            try:
+                return self.filter_regex(search_text, indices)[0]
+            except re.error:
+                return []  # the list shows the error message
+        return self.filter_words(search_text, indices)
+
+    def append_lines(self, new_lines: list[str]) -> None:
+        """Add lines read by the follower.
+
+        Only the new lines are tested against the query the list shows; their
+        indices are appended to the result (which the words-mode narrowing
+        cache shares), so nothing that was already there is scanned again.
+        """
+        new_lines = [line.strip() for line in new_lines]
+        self.speculator.clear()  # the results don't include the new lines
+        start = len(self.lines)
+        if self.indexer is not None:
+            self.indexer.poll()  # a finished index is extended with the new lines
+        self.engine.extend(new_lines)
+        if self.display_fields is not None:
+            self.display_fields.update()
+
+        search_text = self._shown[0] if self._shown is not None else ''
+        matched = self.match_lines(search_text, range(start, len(self.lines)))
+
+        if matched and self._make_item is not None:  # None: the list shows a message instead
+            if isinstance(self.matched, range):
+                self.matched = range(len(self.lines))
+            else:
+                self.matched.extend(matched)
+
+            if self.matching_line_count == 0:
+                self.item_list.set_items(self.matched, self._make_item)  # replaces the placeholder
+            else:
+                self.item_list.extend_indices(self.matched)
+            self.matching_line_count = len(self.matched)
+
+        # evict in batches (10% of the limit) so the eviction cost is amortized
+        if self.max_lines and len(self.lines) > self.max_lines + max(1, self.max_lines // 10):
+            self.evict_lines(len(self.lines) - self.max_lines)
+
+        self.line_count_display.update(self.matching_line_count, len(self.lines))
+
+    def evict_lines(self, count: int) -> None:
+        """Drop the ``count`` oldest lines."""
+        evicted = bisect.bisect_left(self.matched, count)
+        self.speculator.clear()
+        self.item_list.row_cache.clear()  # the rows are cached by line index
+        self.engine.remove(count)
+        if self.display_fields is not None:
+            self.display_fields.remove(count)
+        if self.indexer is not None:
+            self.indexer.remove(count)
+
+        if isinstance(self.matched, range):
+            self.matched = range(len(self.lines))
+        else:
+            self.matched = [i - count for i in self.matched[evicted:]]
+        if self._filter_cache is not None:
+            self._filter_cache = self._filter_cache[:3] + (self.matched,)
+
+        self.matching_line_count = len(self.matched)
+        if self.matched:
+            # the factory reads self.lines, which was shortened in place
+            self.item_list.set_items(self.matched, self._make_item, self.item_list.focus - evicted)
+        else:
+            self.item_list.set_message(urwid.Text(('empty_list', '- empty result -')))
+
+    def request_update(self, search_text: str) -> None:
+        """Filter the list for ``search_text``, coalescing changes made while keys are processed."""
+        self._pending_query = search_text
+        if not self.loop.processing_input:
+            self.flush_update()
+
+    def flush_update(self) -> None:
+        """Apply the pending query, unless the list already shows it."""
+        if self._update_alarm is not None:
+            self.loop.remove_alarm(self._update_alarm)
+            self._update_alarm = None
+
+        search_text, self._pending_query = self._pending_query, None
+        if search_text is None:
+            return
+
+        if self._shown != (search_text, self.case_modifier, self.regexp_modifier):
+            self.update_list(search_text)
+
+    def on_input_done(self) -> None:
+        """Apply the pending query now, or at the next frame if the list was just updated."""
+        self.speculator.resume()
+        if self._pending_query is None:
+            return
+
+        wait = self._last_update + self.loop.frame_interval - time.monotonic()
+        if wait <= 0:
+            self.flush_update()
+        elif self._update_alarm is None:
+            self._update_alarm = self.loop.set_alarm_in(wait, lambda *_: self.flush_update())
+
+    def on_input_filter(self, keys: list, raw: list) -> list:
+        """Apply a bracketed paste to the search box as a single edit."""
+        if self.indexer is not None:
+            self.indexer.pause()  # let the keys have the interpreter
+        self.speculator.pause()
+        passed = []
+        for key in keys:
+            if key == 'begin paste':
+                self._paste = []
+            elif key == 'end paste':
+                if self._paste is not None:
+                    self.paste(''.join(self._paste))
+                self._paste = None
+            elif self._paste is not None:
+                if isinstance(key, str) and len(key) == 1:
+                    self._paste.append(key)
+                elif key in ('enter', 'tab'):
+                    self._paste.append(' ')
+            else:
+                passed.append(key)
+        return passed
+
+    def paste(self, text: str) -> None:
+        """Insert pasted text into the search box."""
+        if self.help_shown:
+            return
+        self.search_edit.insert_text(text)
+        self.view.set_focus('header')
+
+    def update_list(self, search_text: str = '', block: bool = False) -> None:
+        """Filter the list with the given search criteria.
+
+        Under run_async a long words search is sent to the executor and the
+        list is updated when it's done; ``block`` searches right away.
+        """
+        self._last_update = time.monotonic()
+        self._shown = (search_text, self.case_modifier, self.regexp_modifier)
+        self.hscroll = 0
+        self.regex_too_slow = False
+        self.speculator.cancel()
+        if self.indexer is not None:
+            self.indexer.poll()  # take a finished index into use, on this thread only
+        self._waiting_query = None
+
+        # show all lines if search_text is empty
+        if search_text == '' or search_text == '"' or search_text == '""':
+            self._filter_cache = None
+            self.update_item_list(range(len(self.lines)), self.item_factory(search_text))
+            if search_text == '':
+                self.speculator.start(search_text, self.case_modifier, self.matched)
+
+        # search for whole string if search_text begins with quotation mark
+        elif search_text.startswith('"'):
+            self._filter_cache = None
+            self.update_item_list(self.filter_literal(search_text), self.item_factory(search_text),
+                                  '- no matches -')
+
+        # search for regexp if regexp modifier is set
+        elif self.regexp_modifier:
+            self._filter_cache = None
+            reason = exponential_reason(search_text)
+            if reason is not None:
+                self.regex_too_slow = True
+                self.update_item_list([], None, f'- pattern too slow: {reason} -')
+            else:
+                try:
+                    matched, complete = self.filter_regex(search_text)
+                    self.regex_too_slow = not complete
+                    self.update_item_list(matched, self.item_factory(search_text), '- no matches -', complete)
+                except re.error as err:
+                    self.update_item_list([], None, f'Error in regular epression: {err}')
+
+        # split search into words and search for each word
+        else:
+            # while typing, extend the previous result instead of rescanning all
+            # lines: any line matching the longer query also matched the shorter
+            # one, so the new match set is a subset of the previous one
+            matched = self.speculator.take(search_text, self.case_modifier)
+            if matched is None:
+                indices = None
+                cache = self._filter_cache
+                if (cache is not None
+                        and cache[1] == 'words'
+                        and cache[2] == self.case_modifier
+                        and search_text.startswith(cache[0])
+                        and search_text != cache[0]):
+                    indices = cache[3]
+                if (self._async and not block and self.follower is None
+                        and len(self.lines if indices is None else indices) > self.executor_lines):
+                    if self._filter_task is None:
+                        self._filter_task = asyncio.ensure_future(
+                            self.filter_in_executor(search_text, self.case_modifier, indices))
+                    else:
+                        self._waiting_query = search_text
+                else:
+                    matched = self.filter_words(search_text, indices=indices)
+            if matched is not None:
+                self.show_words(search_text, matched)
+
+        self.update_modifiers()
+
+    async def filter_in_executor(self, search_text: str, case_sensitive: bool,
+                                 indices: Optional[Sequence[int]]) -> None:
+        """Search for the words of ``search_text`` in the executor, then show the result.
+
+        A scan in the executor can't be stopped, so only one runs at a time:
+        a query typed meanwhile waits and is searched when this one is done,
+        narrowing its result when it extends this query. The follower isn't
+        running (it would change the lines meanwhile).
+        """
+        matched = await asyncio.get_running_loop().run_in_executor(
+            None, self.engine.filter_words, search_text, case_sensitive, indices)
+        self._filter_task = None
+        # right for this query even if a newer one is shown, the next may narrow it
+        self._filter_cache = (search_text, 'words', case_sensitive, matched)
+        if self._waiting_query is not None:
+            waiting, self._waiting_query = self._waiting_query, None
+            self.update_list(waiting)
+        elif self._shown == (search_text, case_sensitive, False):
+            self.show_words(search_text, matched)
+            self.update_modifiers()
+        else:
+            return  # a newer query was shown without it
+        self.loop.draw_screen()  # not drawn by itself, this isn't an input or alarm callback
+
+    def show_words(self, search_text: str, matched: Sequence[int]) -> None:
+        """Show the result of a words search, and speculate on the next key."""
+        self._filter_cache = (search_text, 'words', self.case_modifier, matched)
+        self.update_item_list(matched, self.item_factory(search_text))
+        self.speculator.start(search_text, self.case_modifier, matched)
+
+    def edit_change(self, _, search_text) -> None:
+        self.request_update(search_text.strip())
+
+    def edit_done(self, _) -> None:
+        self.flush_update()
+        self.view.focus_position = 'body'
+
+    def on_unhandled_input(self, key: Union[str, tuple[str, int, int, int]]) -> bool:
+        if isinstance(key, tuple):  # mouse events
+            return False
+
+        if key == 'enter':
+            self.flush_update()  # select from the list for the query that was typed
+            if self._filter_task is not None:
+                self.update_list(self._shown[0], block=True)
+            focused_widget = self.listbox.get_focus()[0]
+
+            if focused_widget is None:
+                return False
+
+            if isinstance(focused_widget, urwid.Text):
+                return False
+
+            line = focused_widget.line
+
+            self.view.set_header(urwid.AttrMap(
+                urwid.Text(f'selected: {line}'), 'head'))
+
+            self.selected = line
+            raise urwid.ExitMainLoop()
+
+        elif key == 'ctrl a':
+            self.toggle_modifier('case_modifier')
+            self.request_update(self.search_edit.get_edit_text().strip())
+
+        elif key == 'ctrl r':
+            self.toggle_modifier('regexp_modifier')
+            self.request_update(self.search_edit.get_edit_text().strip())
+
+        # elif key == 'ctrl f':
+        #     self.toggle_modifier('fuzzy_modifier')
+
+        elif key == 'backspace':
+            self.search_edit.set_edit_text(self.search_edit.get_text()[0][:-1])
+            self.search_edit.set_edit_pos(len(self.search_edit.get_text()[0]))
+            self.view.set_focus('header')
+
+        elif key == 'f1':
+            self.toggle_help()
+            return True
+
+        elif key == 'esc':
+            self.view.set_focus('header')
+
+        elif key in ('left', 'right') and self.clip_lines and self.view.focus_position == 'body':
+            self.scroll_lines(-8 if key == 'left' else 8)
+
+        elif len(key) == 1:  # ignore things like tab, enter
+            self.search_edit.set_edit_text(self.search_edit.get_text()[0] + key)
+            self.search_edit.set_edit_pos(len(self.search_edit.get_text()[0]))
+            self.view.set_focus('header')
+
+        return False
+
+
+def main() -> None:
+    signal.signal(signal.SIGINT, lambda *_: sys.exit(0))  # perish in style
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--reverse-order',
+                        action='store_true', default=False,
+                        help='reverse the order of the lines')
+
+    parser.add_argument('-b', '--remove-bash-prefix', dest='bash_mode',
+                        action='store_true', default=False,
+                        help='remove the numeric prefix from bash history')
+
+    parser.add_argument('-z', '--remove-zsh-prefix', dest='zsh_mode',
+                        action='store_true', default=False,
+                        help='remove the time prefix from zsh history')
+
+    parser.add_argument('-r', '--regexp',
+                        action='store_true', default=False,
+                        help='start in regexp mode')
+
+    parser.add_argument('-a', '--case-sensitive',
+                        action='store_true', default=False,
+                        help='start in case-sensitive mode')
+
+    parser.add_argument('-d', '--remove-duplicates',
+                        action='store_true', default=False,
+                        help='remove duplicated lines')
+
+    parser.add_argument('-y', '--highlight-matches',
+                        action='store_true', default=False,
+                        help='highlight the part of each line which match the substrings or regexp')
+
+    parser.add_argument('-c', '--cwd', choices=['boost', 'only'], default=None,
+                        help='put commands run in the current directory (or below) first, '
+                             'or show only those (needs the shell hook from selecta_add_keybinding)')
+
+    parser.add_argument('-l', '--clip-lines',
+                        action='store_true', default=False,
+                        help='show every line as a single row, clipped around the first match '
+                             '(scroll with left/right)')
+
+    parser.add_argument('-f', '--follow',
+                        action='store_true', default=False,
+                        help='keep reading lines appended to the infile (like tail -f)')
+
+    parser.add_argument('--max-lines', type=int, default=0,
+                        help='with --follow, drop the oldest lines beyond this number (default: no limit)')
+
+    parser.add_argument('--max-fps', type=float, default=60.0,
+                        help='maximum number of list updates and redraws per second (default: 60)')
+
+    parser.add_argument('--delimiter', default=None,
+                        help='field delimiter for --nth and --with-nth (default: runs of whitespace)')
+
+    parser.add_argument('--nth', type=field_ranges, default=None, metavar='FIELDS',
+                        help='search only these fields, e.g. 3.. or 1,-1 (numbered from 1, negative from the end)')
+
+    parser.add_argument('--with-nth', type=field_ranges, default=None, metavar='FIELDS',
+                        help='show only these fields (the whole line is still selected)')
+
+    parser.add_argument('--regex-budget', type=float, default=0.25,
+                        help='seconds a regexp search may take before a partial result is shown, 0 for no limit '
+                             '(default: 0.25)')
+
+    parser.add_argument('--index-stats',
+                        action='store_true', default=False,
+                        help='print the build time and memory use of the search index to stderr on exit')
+
+    parser.add_argument('infile', nargs='?',
+                        type=argparse.FileType('r'), default=sys.stdin,
+                        help='the file which lines you want to select eg. <(history)')
+
+    parser.add_argument('-v', '--version', action='version', version=f'%(prog)s {__version__}',
+                        help='print selecta version')
+
+    parser.add_argument('-p', '--print', dest='print_result',
+                        action='store_true', default=False,
+                        help='print the selected command to stdout (use with shell wrapper for TIOCSTI-free operation)')
+
+    parser.add_argument('-q', '--query', default='',
+                        help='initial search string (e.g. the current shell command line)')
+
+    args = parser.parse_args()
+
+    # debug('\033[2J')
+
+    # if no infile is given, print help and exit
+    if args.infile.name == '<stdin>' and args.cwd != 'only':
+        parser.print_help()
+        parser.exit(2, '\nYou must provide an infile!\n')
+
+    if args.follow and (args.reverse_order or args.bash_mode or args.zsh_mode or args.remove_duplicates):
+        parser.error('--follow can\'t be combined with -i, -b, -z or -d')
+
+    if args.clip_lines and (args.nth or args.with_nth):
+        parser.error('--clip-lines can\'t be combined with --nth or --with-nth')
+
+    if args.bash_mode or args.zsh_mode:
+        args.reverse_order = True
+        args.remove_duplicates = True
+
+    directory_lines = None
+    if args.cwd is not None:
+        log = HistoryLog(default_log_path())
+        directory_lines = [record.command for record in log.commands_under(current_directory())]
+        if args.infile.name == '<stdin>':
+            args.infile = io.StringIO()
+
+    # In print mode, redirect the TUI to /dev/tty so stdout is free for the result
+    screen = None
+    if args.print_result:
+        try:
+            tty_output = open('/dev/tty', 'w')
+            screen = make_screen(output=tty_output)
+        except (IOError, OSError):
+            print('Error: could not open /dev/tty for TUI output', file=sys.stderr)
+            sys.exit(1)
+
+    selecta = Selecta(
+        infile=args.infile,
+        reverse_order=args.reverse_order,
+        bash_mode=args.bash_mode,
+        zsh_mode=args.zsh_mode,
+        case_sensitive=args.case_sensitive,
+        regexp=args.regexp,
+        remove_duplicates=args.remove_duplicates,
+        highlight_matches=args.highlight_matches,
+        screen=screen,
+        initial_query=args.query,
+        directory_lines=directory_lines,
+        directory_only=args.cwd == 'only',
+        max_fps=args.max_fps,
+        clip_lines=args.clip_lines,
+        follow=args.follow,
+        max_lines=args.max_lines,
+        regex_budget=args.regex_budget,
+        delimiter=args.delimiter,
+        nth=args.nth,
+        with_nth=args.with_nth,
+        # TODO support missing options from the original selector
+    )
+    selected = selecta.run()
+    if args.index_stats:
+        print(selecta.indexer.report() if selecta.indexer is not None else 'index: not used (file is memory-mapped)',
+              file=sys.stderr)
+    if selected is not None:
+        if args.print_result:
+            print(selected)
+        else:
+            inject_command(selected)
+
+
+if __name__ == '__main__':
+    main()
+
@@ -0,0 +1,278 @@
+"""Replay recorded keystroke scripts against a headless Selecta.
+
+A script is plain text: every character is typed as is, ``<name>`` is the
+urwid key ``name`` (``<backspace>``, ``<ctrl a>``, ``<down>``, ...) and
+``<lt>`` types a literal ``<``. Line breaks and lines starting with ``#``
+are ignored. Every key is processed, the resulting list update applied and
+the screen drawn, and the latency of each step is recorded.
+"""
+
+import asyncio
+import io
+import os
+import random
+import re
+import string
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import Callable, Optional
+
+import urwid
+
+from selecta import Selecta
+
+DATA = Path(__file__).parent / 'data'
+
+# p95 latency budget per keystroke in seconds, by corpus size;
+# SELECTA_LATENCY_SCALE stretches them for slow machines
+LATENCY_BUDGETS = {
+    1_000: 0.010,
+    20_000: 0.100,
+    100_000: 0.500,
+}
+LATENCY_SCALE = float(os.environ.get('SELECTA_LATENCY_SCALE', '1'))
+
+TARGET_LINE = 'deploy --target zeta-cluster-7 --dry-run'
+
+
+class FakeScreen(urwid.BaseScreen):
+    """Screen without a terminal; draws the canvas into memory."""
+
+    def __init__(self, cols: int = 100, rows: int = 40) -> None:
+        super().__init__()
+        self.size = (cols, rows)
+        self.content: list[bytes] = []
+
+    def get_cols_rows(self) -> tuple[int, int]:
+        return self.size
+
+    def draw_screen(self, size, canvas) -> None:
+        self.content = list(canvas.text)
+
+    def set_terminal_properties(self, *args, **kwargs) -> None:
+        pass
+
+    def hook_event_loop(self, event_loop, callback) -> None:
+        pass
+
+    def unhook_event_loop(self, event_loop) -> None:
+        pass
+
+
+def parse_script(text: str) -> list[str]:
+    """Return the keys of a keystroke script."""
+    keys: list[str] = []
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        for token in re.findall(r'<[^<>]+>|.', line):
+            if token == '<lt>':
+                keys.append('<')
+            elif len(token) > 1:
+                keys.append(token[1:-1])
+            else:
+                keys.append(token)
+    return keys
+
+
+def make_corpus(size: int, seed: int = 0) -> list[str]:
+    """Return ``size`` shell-history-like lines with TARGET_LINE in the middle."""
+    rng = random.Random(seed)
+    commands = ['git', 'ls', 'cd', 'docker', 'ssh', 'make', 'python', 'grep', 'vim', 'curl']
+    lines = []
+    for _ in range(size - 1):
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+                 for _ in range(rng.randint(2, 7))]
+        lines.append(' '.join([rng.choice(commands)] + words))
+    lines.insert(size // 2, TARGET_LINE)
+    return lines
+
+
+class Replay(object):
+    """Feeds keys into a Selecta running on a FakeScreen and times every step."""
+
+    def __init__(self, selecta: Selecta, idle: bool = False) -> None:
+        self.selecta = selecta
+        # let the idle-time work finish between keys, as a user typing at
+        # human speed would
+        self.idle = idle
+        self.latencies: list[float] = []
+        self.exited = False
+
+    def step(self, key: str) -> None:
+        loop = self.selecta.loop
+        start = time.perf_counter()
+        try:
+            loop.process_input([key])
+            self.selecta.flush_update()
+            loop.draw_screen()
+        except urwid.ExitMainLoop:
+            self.exited = True
+        self.latencies.append(time.perf_counter() - start)
+        if self.idle:
+            while self.selecta.speculator.step():
+                pass
+
+    def run(self, keys: list[str]) -> Optional[str]:
+        """Replay the keys and return the selected line."""
+        self.selecta.loop.draw_screen()
+        for key in keys:
+            if self.exited:
+                break
+            self.step(key)
+        return self.selecta.selected
+
+    def percentile(self, fraction: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[max(0, int(len(ordered) * fraction + 0.5) - 1)]
+
+
+class TestReplay(unittest.TestCase):
+    def replay(self, infile, script: str, idle: bool = False, **kwargs) -> Replay:
+        kwargs.setdefault('reverse_order', False)
+        selecta = Selecta(infile=infile, screen=FakeScreen(), max_fps=0, test_mode=True, **kwargs)
+        replay = Replay(selecta, idle)
+        replay.run(parse_script((DATA / script).read_text()))
+        return replay
+
+    def test_parse_script(self) -> None:
+        self.assertEqual(parse_script('# comment\nab <ctrl a><lt>\n<enter>'),
+                         ['a', 'b', ' ', 'ctrl a', '<', 'enter'])
+
+    def test_history_selection(self) -> None:
+        with open(DATA / 'test_history.txt', 'r') as fh:
+            replay = self.replay(fh, 'replay_history.keys', reverse_order=True,
+                                 bash_mode=True, remove_duplicates=True)
+        self.assertTrue(replay.exited)
+        self.assertEqual(replay.selecta.selected, 'sudo mcedit /etc/influxdb/influxdb.conf')
+
+    def test_latency_budgets(self) -> None:
+        for size, budget in LATENCY_BUDGETS.items():
+            with self.subTest(size=size):
+                corpus = io.StringIO('\n'.join(make_corpus(size)))
+                replay = self.replay(corpus, 'replay_corpus.keys')
+                self.assertEqual(replay.selecta.selected, TARGET_LINE)
+                p95 = replay.percentile(0.95)
+                self.assertLessEqual(
+                    p95, budget * LATENCY_SCALE,
+                    f'p95 keystroke latency {p95 * 1000:.1f} ms over budget '
+                    f'{budget * LATENCY_SCALE * 1000:.1f} ms for {size} lines')
+
+    def test_speculation_during_idle_time(self) -> None:
+        size = 20_000
+        corpus = io.StringIO('\n'.join(make_corpus(size)))
+        replay = self.replay(corpus, 'replay_corpus.keys', idle=True)
+        self.assertEqual(replay.selecta.selected, TARGET_LINE)
+        self.assertGreater(replay.selecta.speculator.hits, 0)
+        self.assertLessEqual(replay.percentile(0.95), LATENCY_BUDGETS[size] * LATENCY_SCALE)
+
+
+class TestAsync(unittest.TestCase):
+    """run_async() on an asyncio loop, with the keys fed by another task."""
+
+    async def select(self, keys: list[str], executor_lines: int,
+                     batch: bool = False,
+                     setup: Optional[Callable[[Selecta], None]] = None) -> tuple[Optional[str], Selecta, int]:
+        selecta = Selecta(infile=io.StringIO('\n'.join(make_corpus(5_000))), reverse_order=False,
+                          screen=FakeScreen(), max_fps=0, test_mode=True,
+                          event_loop=urwid.AsyncioEventLoop(loop=asyncio.get_running_loop()))
+        selecta.executor_lines = executor_lines
+        if setup is not None:
+            setup(selecta)
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        async def typist() -> None:
+            for chunk in [keys] if batch else [[key] for key in keys]:
+                await asyncio.sleep(0.005)
+                selecta.loop.process_input(chunk)
+
+        tasks = [asyncio.ensure_future(ticker()), asyncio.ensure_future(typist())]
+        try:
+            selected = await asyncio.wait_for(selecta.run_async(), 10)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return selected, selecta, ticks
+
+    def test_select(self) -> None:
+        keys = list('zeta clu') + ['down', 'enter']
+        for executor_lines in (0, 100_000):
+            with self.subTest(executor_lines=executor_lines):
+                selected, selecta, ticks = asyncio.run(self.select(keys, executor_lines))
+                self.assertEqual(selected, TARGET_LINE)
+                self.assertGreater(ticks, len(keys))  # the other task kept running
+
+    def test_enter_waits_for_the_executor(self) -> None:
+        # the first enter starts the search in the executor, the second selects
+        selected, selecta, _ = asyncio.run(self.select(list('zeta-cl') + ['enter', 'enter'], 0, batch=True))
+        self.assertEqual(selected, TARGET_LINE)
+
+    def test_one_search_in_the_executor(self) -> None:
+        running = peak = 0
+        lock = threading.Lock()
+
+        def slow_searches(selecta: Selecta) -> None:
+            filter_words = selecta.engine.filter_words
+
+            def slow_filter_words(*args):
+                nonlocal running, peak
+                if threading.current_thread() is threading.main_thread():
+                    return filter_words(*args)  # enter searches inline
+                with lock:
+                    running += 1
+                    peak = max(peak, running)
+                time.sleep(0.02)  # outlasts the next key
+                try:
+                    return filter_words(*args)
+                finally:
+                    with lock:
+                        running -= 1
+
+            selecta.engine.filter_words = slow_filter_words
+            selecta.speculator.start = lambda *args: None  # only the queries typed are searched
+
+        selected, selecta, _ = asyncio.run(self.select(list('zeta clu') + ['down', 'enter'], 0,
+                                                       setup=slow_searches))
+        self.assertEqual(selected, TARGET_LINE)
+        self.assertEqual(peak, 1)
+
+    def test_cancel(self) -> None:
+        selected, selecta, _ = asyncio.run(self.select(['z', 'esc'], 0))
+        self.assertIsNone(selected)
+        self.assertIsNone(selecta._filter_task)
+
+    def test_background_work_stops(self) -> None:
+        async def follow(path: str) -> Selecta:
+            with open(path) as infile:
+                selecta = Selecta(infile=infile, reverse_order=False, follow=True, screen=FakeScreen(),
+                                  test_mode=True, event_loop=urwid.AsyncioEventLoop(loop=asyncio.get_running_loop()))
+                asyncio.get_running_loop().call_later(0.01, selecta.loop.process_input, ['a', 'esc'])
+                await asyncio.wait_for(selecta.run_async(), 10)
+                with open(path, 'a') as fh:
+                    fh.write('gamma\ndelta\n')
+                await asyncio.sleep(0.1)  # a follower left running would read them
+                return selecta
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'service.log')
+            with open(path, 'w') as fh:
+                fh.write('alpha\nbeta\n')
+            selecta = asyncio.run(follow(path))
+        self.assertEqual(selecta.lines, ['alpha', 'beta'])
+        self.assertIsNone(selecta.follower.inotify_fd)
+        self.assertIsNone(selecta._update_alarm)
+        self.assertIsNone(selecta.speculator._alarm)
+
+    def test_needs_an_asyncio_event_loop(self) -> None:
+        selecta = Selecta(infile=io.StringIO('a\nb'), reverse_order=False, screen=FakeScreen(), test_mode=True)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(selecta.run_async())
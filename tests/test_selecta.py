@@ -1,9 +1,27 @@
+import io
+from array import array
+import os
+import re
+import subprocess
+import sys
+import tempfile
 import unittest
 from pathlib import Path
 
 import urwid
 
-from selecta import Selecta, mark_parts, ItemWidgetPlain, ItemWidgetWords
+from selecta import Selecta, mark_parts, pattern_spans, ItemWidgetClipped, ItemWidgetPlain, ItemWidgetWords
+from selecta import aho_corasick
+from selecta.aho_corasick import AhoCorasick
+from selecta.casefold import FoldedLines
+from selecta.engine import SearchEngine
+from selecta.fields import FieldLines, field_ranges
+from selecta.history import HistoryLog
+from selecta.index import LineIndex
+from selecta.linesource import MappedLines
+from selecta.regex_guard import ExponentialPattern, exponential_reason
+from selecta.rowcache import RowCache
+from selecta.speculate import Speculator
 
 
 class TestSelecta(unittest.TestCase):
@@ -191,6 +209,88 @@ class TestSelecta(unittest.TestCase):
         self.assertFalse(selecta.help_shown)
         self.assertIs(selecta.view.body, selecta.listbox)
 
+    def _count_updates(self, selecta: Selecta) -> list:
+        calls = []
+        update_list = selecta.update_list
+
+        def counting_update_list(search_text: str = '') -> None:
+            calls.append(search_text)
+            update_list(search_text)
+
+        selecta.update_list = counting_update_list
+        return calls
+
+    def test_paste_is_one_update(self) -> None:
+        selecta = self._selecta()
+        calls = self._count_updates(selecta)
+        keys = selecta.on_input_filter(['begin paste', *'app', 'enter', *'bana', 'end paste'], [])
+        self.assertEqual(keys, [])
+        self.assertEqual(selecta.search_edit.get_edit_text(), 'app bana')
+        self.assertEqual(calls, ['app bana'])
+        self.assertEqual(selecta.matching_line_count, 3)
+
+    def test_key_batch_is_one_update(self) -> None:
+        selecta = self._selecta(max_fps=0)
+        calls = self._count_updates(selecta)
+        selecta.loop.process_input(list('apple'))
+        self.assertEqual(calls, ['apple'])
+        self.assertEqual(selecta.matching_line_count, 3)
+
+    def test_burst_is_coalesced_into_next_frame(self) -> None:
+        selecta = self._selecta(max_fps=1)
+        calls = self._count_updates(selecta)
+        selecta.loop.process_input(['s'])
+        selecta.loop.process_input(['t'])
+        self.assertEqual(calls, [])  # within the same frame as the initial update
+        selecta.flush_update()
+        self.assertEqual(calls, ['st'])
+        self.assertEqual(selecta.matching_line_count, 1)
+
+    def test_unchanged_query_is_skipped(self) -> None:
+        selecta = self._selecta(max_fps=0)
+        calls = self._count_updates(selecta)
+        selecta.loop.process_input(['x', 'backspace'])
+        self.assertEqual(calls, [])
+
+    def _row_text(self, widget: urwid.Widget, width: int) -> str:
+        canvas = widget.render((width,))
+        self.assertEqual(canvas.rows(), 1)
+        return b''.join(canvas.text).decode()
+
+    def test_clipped_row_shows_first_match(self) -> None:
+        line = 'x' * 100_000 + 'needle' + 'y' * 100_000
+        widget = ItemWidgetClipped(line, pattern_spans(re.compile('needle')), True, lambda: 0)
+        self.assertEqual(widget.rows((40,)), 1)
+        text = self._row_text(widget, 40)
+        self.assertEqual(len(text), 40)
+        self.assertIn('needle', text)
+        self.assertEqual(text.index('needle'), 10)  # a quarter of the width as left context
+
+    def test_clipped_row_scrolls(self) -> None:
+        offset = [0]
+        widget = ItemWidgetClipped('0123456789' * 10, None, False, lambda: offset[0])
+        self.assertEqual(self._row_text(widget, 10), '0123456789')
+        offset[0] = 3
+        widget._invalidate()
+        self.assertEqual(self._row_text(widget, 10), '3456789012')
+
+    def test_clip_lines_uses_clipped_widgets(self) -> None:
+        selecta = self._selecta(clip_lines=True, highlight_matches=True)
+        selecta.edit_change(None, 'bana')
+        self.assertIsInstance(selecta.item_list[0], ItemWidgetClipped)
+        self.assertEqual(selecta.matching_line_count, 3)
+        self.assertIn('bana', self._row_text(selecta.item_list[0], 20))
+
+    def test_clipped_row_casefolds(self) -> None:
+        selecta = Selecta(infile=io.StringIO('x' * 100 + 'Stra\u00dfe 5\n'), reverse_order=False, test_mode=True,
+                          clip_lines=True, highlight_matches=True)
+        selecta.edit_change(None, 'strasse')
+        widget = selecta.item_list[0]
+        self.assertEqual(widget.anchor(), (100, 106))
+        self.assertEqual(self._row_text(widget, 20), 'x' * 5 + 'Stra\u00dfe 5' + ' ' * 7)
+        text, runs = widget._text.get_text()
+        self.assertEqual(runs[1], ('match', len('Stra\u00dfe')))
+
     def test_mark_parts1(self) -> None:
         parts = mark_parts('orange cherry Orange apple Banana banana Pear apple', ['bana', 'apple', 'pear'], case_sensitive=False, highlight_matches=True)
         self.assertEqual(parts, ['orange cherry Orange ', ('match', 'apple'), ' ', ('match', 'Bana'), 'na ', ('match', 'bana'), 'na ', ('match', 'Pear'), ' ', ('match', 'apple')])
@@ -202,3 +302,632 @@ class TestSelecta(unittest.TestCase):
     def test_mark_parts3(self) -> None:
         parts = mark_parts('apple orange cherry apple banana banana pear', ['pear', 'banana'], case_sensitive=True, highlight_matches=True)
         self.assertEqual(parts, ['apple orange cherry apple ', ('match', 'banana'), ' ', ('match', 'banana'), ' ', ('match', 'pear')])
+
+    def test_mark_parts_overlapping_words(self) -> None:
+        parts = mark_parts('banana split', ['ban', 'ana'], case_sensitive=True, highlight_matches=True)
+        self.assertEqual(parts, [('match', 'banana'), ' split'])
+
+    def test_mark_parts_casefolded(self) -> None:
+        parts = mark_parts('Stra\u00dfe 5', ['STRASSE'], case_sensitive=False, highlight_matches=True)
+        self.assertEqual(parts, [('match', 'Stra\u00dfe'), ' 5'])
+
+    def test_words_implied_by_longer_words(self) -> None:
+        selecta = self._selecta()
+        selecta.edit_change(None, 'ban banana an')
+        implied = selecta.matching_line_count
+
+        fresh = self._selecta()
+        fresh.edit_change(None, 'banana')
+        self.assertEqual(implied, fresh.matching_line_count)
+
+
+class TestFollow(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'service.log')
+        with open(self.path, 'w') as fh:
+            fh.write('start service\nerror: disk full\n')
+        self.infile = open(self.path, 'r')
+
+    def tearDown(self) -> None:
+        self.infile.close()
+        self.tmpdir.cleanup()
+
+    def _selecta(self, **kwargs) -> Selecta:
+        selecta = Selecta(infile=self.infile, reverse_order=False, follow=True, test_mode=True, **kwargs)
+        self.addCleanup(selecta.follower.stop)
+        return selecta
+
+    def _append(self, text: str) -> None:
+        with open(self.path, 'a') as fh:
+            fh.write(text)
+
+    def test_new_lines_are_filtered(self) -> None:
+        selecta = self._selecta()
+        selecta.edit_change(None, 'error')
+        self.assertEqual(selecta.matching_line_count, 1)
+
+        self._append('all good\nerror: timeout\nerror: par')
+        selecta.follower.read()
+        self.assertEqual(selecta.matching_line_count, 2)
+        self.assertEqual(selecta.line_count_display.text, '2/4')
+
+        self._append('tial line\n')
+        selecta.follower.read()
+        self.assertEqual(selecta.item_list[-1].line, 'error: partial line')
+        self.assertEqual(selecta.matching_line_count, 3)
+
+    def test_new_lines_replace_empty_result(self) -> None:
+        selecta = self._selecta()
+        selecta.edit_change(None, 'timeout')
+        self.assertEqual(selecta.matching_line_count, 0)
+        self._append('error: timeout\n')
+        selecta.follower.read()
+        self.assertEqual([item.line for item in selecta.item_list], ['error: timeout'])
+
+    def test_narrowing_after_append(self) -> None:
+        selecta = self._selecta()
+        selecta.edit_change(None, 'err')
+        self._append('error: timeout\n')
+        selecta.follower.read()
+        selecta.edit_change(None, 'error time')  # narrows the extended cache
+        self.assertEqual([item.line for item in selecta.item_list], ['error: timeout'])
+
+    def test_appended_lines_are_indexed(self) -> None:
+        selecta = self._selecta()
+        selecta.start_indexer()
+        selecta.indexer.wait()
+        self._append('error: timeout\n')
+        selecta.follower.read()
+        selecta.edit_change(None, 'timeout')
+        self.assertEqual([item.line for item in selecta.item_list], ['error: timeout'])
+
+    def test_rejected_pattern_ignores_new_lines(self) -> None:
+        selecta = self._selecta(regexp=True)
+        selecta.edit_change(None, '(a+)+')
+        self._append('aaa\n')
+        selecta.follower.read()
+        self.assertEqual(selecta.matching_line_count, 0)
+        self.assertEqual(selecta.line_count_display.text, '0/3')
+        self.assertIn('pattern too slow', selecta.item_list[0].get_text()[0])
+
+    def test_max_lines_evicts_oldest(self) -> None:
+        selecta = self._selecta(max_lines=3)
+        selecta.edit_change(None, 'error')
+        self._append(''.join(f'error {i}\n' for i in range(5)))
+        selecta.follower.read()
+        self.assertEqual(selecta.lines, ['error 2', 'error 3', 'error 4'])
+        self.assertEqual([item.line for item in selecta.item_list], selecta.lines)
+        self.assertEqual(selecta.matching_line_count, 3)
+        selecta.edit_change(None, 'error 3')
+        self.assertEqual(selecta.matching_line_count, 1)
+
+    def test_eviction_keeps_the_index(self) -> None:
+        selecta = self._selecta(max_lines=20)
+        selecta.start_indexer()
+        index = selecta.indexer.wait()
+        for batch in range(10):
+            self._append(''.join(f'line {batch}-{i} word{i % 4}\n' for i in range(7)))
+            selecta.follower.read()
+        self.assertIs(selecta.engine.index, index)
+        self.assertEqual(index.count, len(selecta.lines))
+        selecta.edit_change(None, 'word2')
+        self.assertEqual([item.line for item in selecta.item_list],
+                         [line for line in selecta.lines if 'word2' in line])
+
+    def test_eviction_during_build(self) -> None:
+        selecta = self._selecta(max_lines=3)
+        selecta.indexer.pause_time = 0.2
+        selecta.indexer.pause()  # the build holds off until the lines were evicted
+        selecta.start_indexer()
+        self._append(''.join(f'error {i}\n' for i in range(5)))
+        selecta.follower.read()
+        self.assertIsNone(selecta.engine.index)
+        index = selecta.indexer.wait()
+        self.assertEqual(index.count, 3)
+        selecta.edit_change(None, 'error 3')
+        self.assertEqual([item.line for item in selecta.item_list], ['error 3'])
+
+
+class TestMappedLines(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _open(self, data: bytes):
+        path = os.path.join(self.tmpdir.name, 'lines.txt')
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        infile = open(path, 'r', encoding='utf-8')
+        self.addCleanup(infile.close)
+        return infile
+
+    def test_lines(self) -> None:
+        lines = MappedLines(self._open(b'one\n  two  \n\nthree'))
+        self.assertEqual(list(lines), ['one', 'two', '', 'three'])
+        self.assertEqual(lines[-1], 'three')
+        self.assertEqual(lines[1:3], ['two', ''])
+
+    def test_find_words(self) -> None:
+        lines = MappedLines(self._open('Foo bar\nbar\nfoo BAR foo\nGr\u00fc\u00dfe foo\n'.encode()))
+        self.assertEqual(lines.find_words(['foo', 'bar'], False), [0, 2])
+        self.assertEqual(lines.find_words(['foo'], True), [2, 3])
+        self.assertEqual(lines.find_words(['bar'], False, [1, 3]), [1])
+        self.assertEqual(lines.find_words(['GR\u00dc\u00dfE'], False), [3])
+        self.assertEqual(lines.find_words(['SSE'], False), [3])
+        self.assertEqual(lines.find_words(['GR\u00dcSSE'], False, [0, 3]), [3])
+
+    def test_only_non_ascii_lines_are_folded(self) -> None:
+        lines = MappedLines(self._open('caf\u00e9 au lait\nCAFE\nStra\u00dfe\ncafe STRASSE\n'.encode()))
+        self.assertEqual(lines.find_words(['caf'], False), [0, 1, 3])
+        self.assertEqual(lines.find_words(['strasse'], False), [2, 3])
+        self.assertEqual(lines.find_words(['CAF\u00c9'], False), [0])
+        self.assertEqual(sorted(lines._folded), [0, 2])
+        self.assertEqual(lines.find_words(['strasse'], False, [1, 2]), [2])
+
+    def test_selecta_uses_mapped_lines(self) -> None:
+        infile = self._open(b'start service\nerror: disk full\nerror: timeout\n')
+        selecta = Selecta(infile=infile, reverse_order=False, test_mode=True)
+        self.assertIsInstance(selecta.lines, MappedLines)
+        selecta.edit_change(None, 'ERR time')
+        self.assertEqual([item.line for item in selecta.item_list], ['error: timeout'])
+        selecta.edit_change(None, '"error')
+        self.assertEqual(selecta.matching_line_count, 2)
+
+
+class TestRegexGuard(unittest.TestCase):
+    def _selecta(self, lines: list[str], **kwargs) -> Selecta:
+        return Selecta(infile=io.StringIO('\n'.join(lines)), reverse_order=False, regexp=True,
+                       test_mode=True, **kwargs)
+
+    def test_exponential_patterns(self) -> None:
+        for pattern in (r'(a+)+$', r'(?:x*y*)*z', r'(ab|ab)+', r'(a*b+)*$', r'(a+a+)+$'):
+            with self.subTest(pattern=pattern):
+                self.assertIsNotNone(exponential_reason(pattern))
+        for pattern in (r'a+b+', r'(\w+\s)+$', r'(a|ab)*', r'(a+){1,5}',
+                        r'(\w+\s+)+$', r'(\S+\s+)+foo', r'(a+b+)+'):
+            with self.subTest(pattern=pattern):
+                self.assertIsNone(exponential_reason(pattern))
+
+    def test_exponential_pattern_is_not_run(self) -> None:
+        selecta = self._selecta(['aaaa'])
+        selecta.edit_change(None, '(a+)+$')
+        self.assertEqual(selecta.matching_line_count, 0)
+        self.assertIn('too slow', selecta.modifier_display.text)
+        self.assertIn('nested quantifiers', selecta.item_list[0].text)
+
+    def test_budget_gives_partial_result(self) -> None:
+        selecta = self._selecta(['aa', 'a' * 40 + 'b', 'aaa'], regex_budget=0.05)
+        selecta.edit_change(None, '(a|aa)+$')  # exponential, but not recognized as such
+        self.assertEqual([item.line for item in selecta.item_list], ['aa'])
+        self.assertIn('too slow', selecta.modifier_display.text)
+        self.assertEqual(selecta.line_count_display.text, '1+/3')
+
+        selecta.edit_change(None, 'a+$')
+        self.assertEqual(selecta.matching_line_count, 2)
+        self.assertNotIn('too slow', selecta.modifier_display.text)
+        self.assertEqual(selecta.line_count_display.text, '2/3')
+
+
+class TestFoldedLines(unittest.TestCase):
+    def test_find_words(self) -> None:
+        folded = FoldedLines(['Stra\u00dfe', 'STRASSE', 'Weg', 'stra\u1e9ee'])
+        self.assertEqual(folded.find_words(['strasse']), [0, 1, 3])
+        self.assertEqual(folded.find_words(['STRA\u00dfE'], [1, 2]), [1])
+        self.assertEqual(folded.find_words(['weg', 'x']), [])
+        # only the non-ASCII lines got a shadow
+        self.assertEqual(sorted(folded.shadow), [0, 3])
+
+    def test_lines_with_newlines(self) -> None:
+        folded = FoldedLines(['multi\nLINE', 'line'])
+        self.assertEqual(folded.find_words(['line']), [0, 1])
+
+    def test_selecta_casefolds(self) -> None:
+        infile = io.StringIO('Stra\u00dfe 5\nWeg 7\n')
+        selecta = Selecta(infile=infile, reverse_order=False, test_mode=True)
+        selecta.edit_change(None, 'STRASSE')
+        self.assertEqual([item.line for item in selecta.item_list], ['Stra\u00dfe 5'])
+
+
+class TestFields(unittest.TestCase):
+    LOG = ['2024-05-01 10:00 web1 error: disk full',
+           '2024-05-01 10:01 db1 all good',
+           '2024-05-01 10:02 web2 restarted web1']
+
+    def _selecta(self, lines: list[str], **kwargs) -> Selecta:
+        return Selecta(infile=io.StringIO('\n'.join(lines)), reverse_order=False, test_mode=True, **kwargs)
+
+    def test_field_ranges(self) -> None:
+        self.assertEqual(field_ranges('2'), [(2, 2)])
+        self.assertEqual(field_ranges('1,3..4,-1'), [(1, 1), (3, 4), (-1, -1)])
+        self.assertEqual(field_ranges('3..'), [(3, None)])
+        self.assertEqual(field_ranges('..2'), [(1, 2)])
+        for spec in ('', 'a', '0', '1..x'):
+            with self.subTest(spec=spec):
+                self.assertRaises(ValueError, field_ranges, spec)
+
+    def test_whitespace_fields(self) -> None:
+        lines = ['a  bb ccc', 'x', '']
+        fields = FieldLines(lines, [(2, None)])
+        self.assertEqual(list(fields), ['bb ccc', '', ''])
+        fields = FieldLines(lines, [(-1, -1), (1, 1)])
+        self.assertEqual(list(fields), ['ccc a', 'x x', ''])
+        self.assertEqual(fields.spans(0), [(6, 9), (0, 1)])
+        self.assertEqual(len(fields.offsets), 2 * 2 * len(lines))
+
+    def test_delimited_fields(self) -> None:
+        lines = ['a\tb c\t\td', 'e']
+        fields = FieldLines(lines, [(2, 3)], '\t')
+        self.assertEqual(list(fields), ['b c\t', ''])
+        lines.append('f\tg')
+        fields.update()
+        self.assertEqual(fields[-1], 'g')
+        fields.remove(2)
+        lines[:2] = []
+        self.assertEqual(list(fields), ['g'])
+
+    def test_search_is_restricted_to_fields(self) -> None:
+        selecta = self._selecta(self.LOG, nth=field_ranges('3..'))
+        selecta.edit_change(None, '10:01')
+        self.assertEqual(selecta.matching_line_count, 0)
+        selecta.edit_change(None, 'web1')
+        self.assertEqual(selecta.matching_line_count, 2)
+        selecta.edit_change(None, '"db1')
+        self.assertEqual(selecta.matching_line_count, 1)
+        selecta.toggle_modifier('regexp_modifier')
+        selecta.edit_change(None, '^web')
+        self.assertEqual(selecta.matching_line_count, 2)
+
+    def test_highlight_only_in_searched_fields(self) -> None:
+        selecta = self._selecta(self.LOG, nth=field_ranges('4..'), highlight_matches=True)
+        selecta.edit_change(None, 'web1')
+        self.assertEqual([item.line for item in selecta.item_list], [self.LOG[2]])
+        text, attributes = selecta.item_list[0]._text.get_text()
+        self.assertEqual(text, self.LOG[2])
+        # only the second "web1" is marked
+        self.assertEqual(attributes, [(None, 32), ('match', 4)])
+
+    def test_shown_fields(self) -> None:
+        selecta = self._selecta(self.LOG, with_nth=field_ranges('3,-1'), nth=field_ranges('1'),
+                                highlight_matches=True)
+        self.assertEqual(selecta.item_list[0]._text.text, 'web1 full')
+        selecta.edit_change(None, '2024 good')  # "good" isn't in the searched field
+        self.assertEqual(selecta.matching_line_count, 0)
+        selecta.edit_change(None, '2024')
+        self.assertEqual(selecta.matching_line_count, 3)
+        self.assertEqual(selecta.item_list[1]._text.text, 'db1 good')
+        self.assertEqual(selecta.item_list[1].line, self.LOG[1])
+
+    def test_follow_with_fields(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'service.log')
+            with open(path, 'w') as fh:
+                fh.write('1 start\n')
+            with open(path, 'r') as infile:
+                selecta = Selecta(infile=infile, reverse_order=False, follow=True, test_mode=True,
+                                  nth=field_ranges('2'), max_lines=1)
+                self.addCleanup(selecta.follower.stop)
+                selecta.edit_change(None, '2')
+                with open(path, 'a') as fh:
+                    fh.write('2 x\n3 2\n')
+                selecta.follower.read()
+                self.assertEqual([item.line for item in selecta.item_list], ['3 2'])
+
+
+class TestIndex(unittest.TestCase):
+    QUERIES = ['sudo', 'git pu', 'CONF', 'ap', 'etc influx', 'nothing-like-this']
+
+    def _selecta(self, **kwargs) -> Selecta:
+        with open(Path(__file__).parent / 'data' / 'test_history.txt', 'r') as fh:
+            return Selecta(infile=fh, reverse_order=True, bash_mode=True, test_mode=True, **kwargs)
+
+    def _matches(self, selecta: Selecta) -> dict:
+        matches = {}
+        for case_sensitive in (False, True):
+            selecta.case_modifier = case_sensitive
+            for query in self.QUERIES:
+                selecta.update_list(query)
+                matches[case_sensitive, query] = list(selecta.matched)
+        return matches
+
+    def test_indexed_search_matches_scan(self) -> None:
+        selecta = self._selecta()
+        selecta.start_indexer()
+        self.assertTrue(selecta.index_display.text.startswith('indexing'))
+        index = selecta.indexer.wait()
+        selecta.update_index_display()
+        self.assertEqual(selecta.index_display.text, '')
+        self.assertIsNotNone(index.postings)
+        self.assertEqual(self._matches(selecta), self._matches(self._selecta(build_index=False)))
+
+    def test_candidates(self) -> None:
+        index = self._selecta().indexer
+        index.start()
+        line_index = index.wait()
+        self.assertEqual(line_index.candidates(['ap']), None)  # too short for a trigram
+        self.assertEqual(line_index.candidates(['nothing-like-this']), [])
+        self.assertIn('index: 121 lines', index.report())
+
+    def test_remove(self) -> None:
+        index = LineIndex()
+        index.add(['alpha', 'beta', 'alphabet', 'gamma'])
+        index.remove(1)
+        self.assertEqual(index.candidates(['alpha']), [1])
+        self.assertEqual(index.candidates(['bet']), [0, 1])
+        index.add(['alpine'])
+        self.assertEqual(index.candidates(['alp']), [1, 3])
+        index.remove(2)  # as many removed as left: the postings are trimmed
+        self.assertEqual(index.candidates(['alp']), [1])
+        self.assertEqual(min(min(posting) for posting in index.postings.values()), index.base)
+
+
+class TestEngine(unittest.TestCase):
+    QUERIES = ['sudo', 'git pu', 'CONF', 'ap', 'etc influx', 'pu git', '', 'nothing-like-this']
+
+    def _engine(self, **kwargs) -> SearchEngine:
+        with open(Path(__file__).parent / 'data' / 'test_history.txt', 'r') as fh:
+            return SearchEngine(fh, **kwargs)
+
+    def test_import_without_urwid(self) -> None:
+        code = ("import sys; sys.modules['urwid'] = None\n"
+                "from selecta.engine import SearchEngine\n"
+                "from selecta import engine, history\n"
+                "print(list(engine.SearchEngine(['a b', 'b']).search('b')), 'selecta.tui' in sys.modules)")
+        source = str(Path(sys.modules[SearchEngine.__module__].__file__).parent.parent)
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [source, os.environ.get('PYTHONPATH')]))}
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout, '[0, 1] False\n')
+
+    def test_search(self) -> None:
+        engine = SearchEngine(['Foo bar', 'bar', 'foo BAR foo', 'baz'])
+        self.assertEqual(engine.search('foo bar'), array('i', [0, 2]))
+        self.assertEqual(engine.search('foo', case_sensitive=True), array('i', [2]))
+        self.assertEqual(engine.search(''), array('i', [0, 1, 2, 3]))
+        self.assertEqual(engine.search('ba', mode='literal'), array('i', [1, 3]))
+        self.assertEqual(engine.search('FOO', mode='literal'), array('i', [0, 2]))
+        self.assertEqual(engine.search('^ba[rz]$', mode='regexp'), array('i', [1, 3]))
+        with self.assertRaises(ValueError):
+            engine.search('foo', mode='fuzzy')
+        with self.assertRaises(re.error):
+            engine.search('(', mode='regexp')
+        self.assertEqual(engine.filter_words(' ', False), [0, 1, 2, 3])
+        self.assertEqual(engine.filter_words('', True, [1, 3]), [1, 3])
+
+    def test_slow_patterns(self) -> None:
+        engine = SearchEngine(['aa', 'a' * 40 + 'b', 'aaa'], regex_budget=0.05)
+        for search in (lambda: engine.search('(a+)+$', mode='regexp'),
+                       lambda: engine.search_many(['a', '(a+)+$'], mode='regexp')):
+            with self.assertRaises(ExponentialPattern):
+                search()
+        # exponential, but not recognized as such: cut short by the budget
+        self.assertEqual(engine.search_many(['(a|aa)+$', 'b$'], mode='regexp'),
+                         [array('i', [0]), array('i', [1])])
+
+    def test_search_many_matches_search(self) -> None:
+        for engine in (self._engine(), self._engine(nth=[(1, 1)])):
+            for case_sensitive in (False, True):
+                for mode in ('words', 'literal'):
+                    with self.subTest(case_sensitive=case_sensitive, mode=mode, nth=engine.search_fields is not None):
+                        self.assertEqual(engine.search_many(self.QUERIES, mode, case_sensitive),
+                                         [engine.search(query, mode, case_sensitive) for query in self.QUERIES])
+            engine.build_index()
+            self.assertEqual(engine.search_many(self.QUERIES), [engine.search(query) for query in self.QUERIES])
+
+    def test_mapped_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'lines.txt')
+            with open(path, 'w') as fh:
+                fh.write('start service\nerror: disk full\nerror: timeout\n')
+            with open(path) as fh:
+                engine = SearchEngine(fh)
+                self.assertIsInstance(engine.lines, MappedLines)
+                self.assertIsNone(engine.build_index())
+                self.assertEqual(engine.search_many(['ERR', 'err time', 'disk']),
+                                 [array('i', [1, 2]), array('i', [2]), array('i', [1])])
+                engine.lines.close()
+
+    def test_extend_and_remove(self) -> None:
+        engine = SearchEngine(iter(['  one a ', 'two b']), nth=[(2, 2)])
+        self.assertEqual(engine.lines, ['one a', 'two b'])
+        engine.build_index()
+        engine.extend(['three abc', 'four xabcx'])
+        self.assertEqual(engine.search('abc'), array('i', [2, 3]))
+        self.assertEqual(engine.search('one'), array('i', []))  # only the second field is searched
+        engine.remove(2)
+        self.assertEqual(engine.index.count, 2)  # kept, the removed lines are dropped from it
+        self.assertEqual(engine.search('abc x'), array('i', [1]))
+        self.assertEqual(engine.search('b', mode='literal'), array('i', []))
+        self.assertEqual(engine.search('x', mode='literal'), array('i', [1]))
+
+
+class TestSpeculator(unittest.TestCase):
+    LINES = ['git push origin', 'git pull', 'git pull --rebase', 'grep -r pull', 'GIT PUSH']
+
+    def _selecta(self, **kwargs) -> Selecta:
+        return Selecta(infile=io.StringIO('\n'.join(self.LINES)), reverse_order=False, test_mode=True, **kwargs)
+
+    def _idle(self, selecta: Selecta) -> None:
+        while selecta.speculator.step():
+            pass
+
+    def test_next_characters(self) -> None:
+        speculator = Speculator(None, None, self.LINES)
+        # "l" follows "pu" in three lines, "s" in two
+        self.assertEqual(speculator.next_characters('git pu', False, range(5)), ['l', 's'])
+        self.assertEqual(speculator.next_characters('git pu', True, range(5)), ['l', 's'])
+        self.assertEqual(speculator.next_characters('git pull --', False, [2]), ['r'])
+        self.assertEqual(speculator.next_characters('git pull', False, [1, 3]), [])  # nothing follows
+
+    def test_next_key_is_a_lookup(self) -> None:
+        selecta = self._selecta()
+        selecta.edit_change(None, 'git pu')
+        self._idle(selecta)
+        self.assertIn(('git pul', False), selecta.speculator.cache)
+
+        selecta.edit_change(None, 'git PUS')
+        self.assertEqual(selecta.speculator.hits, 1)
+        self.assertEqual([item.line for item in selecta.item_list], ['git push origin', 'GIT PUSH'])
+        selecta.edit_change(None, 'git push')  # not speculated on yet
+        self.assertEqual(selecta.speculator.hits, 1)
+        self.assertEqual(selecta.matching_line_count, 2)
+
+    def test_results_match_full_scan(self) -> None:
+        for case_sensitive in (False, True):
+            selecta = self._selecta(case_sensitive=case_sensitive)
+            fresh = self._selecta(case_sensitive=case_sensitive)
+            for query in ('', 'g', 'gi', 'git', 'git p', 'git pu', 'git pul', 'git pull'):
+                with self.subTest(query=query, case_sensitive=case_sensitive):
+                    selecta.edit_change(None, query)
+                    self._idle(selecta)
+                    fresh.speculator.clear()
+                    fresh._filter_cache = None
+                    fresh.edit_change(None, query)
+                    self.assertEqual(list(selecta.matched), list(fresh.matched))
+            self.assertGreater(selecta.speculator.hits, 0)
+
+    def test_input_pauses_the_work(self) -> None:
+        selecta = self._selecta()
+        selecta.edit_change(None, 'gi')
+        self.assertIsNotNone(selecta.speculator._alarm)
+        selecta.on_input_filter(['x'], [])
+        self.assertIsNone(selecta.speculator._alarm)
+        selecta.on_input_done()
+        self.assertIsNotNone(selecta.speculator._alarm)
+
+    def test_cache_is_bounded(self) -> None:
+        speculator = Speculator(None, None, [])
+        speculator.cache_size = 2
+        speculator.max_indices = 5
+        speculator.store(('a', False), array('i', [1, 2]))
+        speculator.store(('b', False), array('i', [1]))
+        speculator.take('a', False)
+        speculator.store(('c', False), array('i', [3]))
+        self.assertEqual(list(speculator.cache), [('a', False), ('c', False)])
+        speculator.store(('d', False), array('i', [1, 2, 3, 4]))
+        self.assertEqual(list(speculator.cache), [('c', False), ('d', False)])
+
+
+class TestRowCache(unittest.TestCase):
+    def _selecta(self, **kwargs) -> Selecta:
+        lines = [f'apple {i}' for i in range(30)] + ['banana']
+        return Selecta(infile=io.StringIO('\n'.join(lines)), reverse_order=False, test_mode=True, **kwargs)
+
+    def _screen(self, selecta: Selecta) -> list:
+        """Return the text and attributes of the list drawn 40x10."""
+        return list(selecta.listbox.render((40, 10), focus=True).content())
+
+    def test_lru(self) -> None:
+        cache = RowCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(list(cache.canvases), ['a', 'c'])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_rows_are_reused_while_narrowing(self) -> None:
+        selecta = self._selecta()
+        selecta.edit_change(None, 'ap')
+        self._screen(selecta)
+        cache = selecta.item_list.row_cache
+        hits = cache.hits
+        selecta.edit_change(None, 'apple')
+        self._screen(selecta)
+        self.assertGreaterEqual(cache.hits - hits, 10)
+
+    def test_highlight_is_part_of_the_key(self) -> None:
+        selecta = self._selecta(highlight_matches=True)
+        fresh = self._selecta(highlight_matches=True)
+        for query in ('ap', 'apple', 'apple 1', 'ap'):
+            with self.subTest(query=query):
+                selecta.edit_change(None, query)
+                fresh.item_list.row_cache.clear()
+                fresh.edit_change(None, query)
+                self.assertEqual(self._screen(selecta), self._screen(fresh))
+
+    def test_scrolling_reuses_rows(self) -> None:
+        selecta = self._selecta()
+        self._screen(selecta)
+        selecta.listbox.set_focus(1)
+        self._screen(selecta)
+        hits = selecta.item_list.row_cache.hits
+        selecta.listbox.set_focus(0)
+        selecta.item_list._items.clear()  # fresh widgets, as after a query change
+        self._screen(selecta)
+        self.assertGreaterEqual(selecta.item_list.row_cache.hits - hits, 10)
+
+
+class TestAhoCorasick(unittest.TestCase):
+    def test_spans(self) -> None:
+        matcher = AhoCorasick(['he', 'she', 'his', 'hers'])
+        self.assertEqual(matcher.spans('ushers'), [(1, 6)])
+        self.assertEqual(matcher.spans('his hat'), [(0, 3)])
+        self.assertEqual(matcher.spans('nothing'), [])
+
+    def test_long_text_spans(self) -> None:
+        matcher = AhoCorasick(['he', 'she', 'his', 'hers', 'aa'])
+        text = 'ushers his hat aaa he-she ' * 500
+        self.assertGreater(len(text), aho_corasick.LONG_TEXT)
+        expected = []
+        for k in range(500):  # the same spans, shifted, as in the short text
+            expected.extend((start + 26 * k, end + 26 * k) for start, end in matcher.spans(text[:26]))
+        self.assertEqual(matcher.spans(text), expected)
+        self.assertEqual(AhoCorasick([]).spans(text), [])
+
+    def test_found(self) -> None:
+        matcher = AhoCorasick(['apple', 'pear', 'plum'])
+        self.assertEqual(matcher.found('apple pear'), 0b011)
+        self.assertEqual(matcher.found('plum apple pear'), matcher.all_found)
+
+    def test_required_words(self) -> None:
+        matcher = AhoCorasick(['ban', 'banana', 'ana', 'x', 'x'])
+        self.assertEqual(matcher.required_words(), ['banana', 'x'])
+
+
+class TestHistoryLog(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log = HistoryLog(os.path.join(self.tmpdir.name, 'history.log'))
+        for timestamp, (cwd, command) in enumerate([
+            ('/home/me', 'ls'),
+            ('/home/me/project', 'make'),
+            ('/home/meta', 'vim notes'),
+            ('/tmp', 'rm -rf foo'),
+            ('/home/me/project/src', 'grep -r TODO'),
+            ('/home/me', 'git status'),
+        ]):
+            self.log.append(cwd, command, timestamp=float(timestamp))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_subtree_newest_first(self) -> None:
+        commands = [record.command for record in self.log.commands_under('/home/me')]
+        self.assertEqual(commands, ['git status', 'grep -r TODO', 'make', 'ls'])
+
+    def test_subtree_trailing_slash(self) -> None:
+        commands = [record.command for record in self.log.commands_under('/home/me/project/')]
+        self.assertEqual(commands, ['grep -r TODO', 'make'])
+
+    def test_root_contains_everything(self) -> None:
+        self.assertEqual(len(list(self.log.commands_under('/'))), 6)
+
+    def test_missing_table_is_rebuilt(self) -> None:
+        os.remove(self.log.table_path)
+        self.log.append('/tmp', 'ls')
+        commands = [record.command for record in self.log.commands_under('/tmp')]
+        self.assertEqual(commands, ['ls', 'rm -rf foo'])
+
+    def test_missing_log(self) -> None:
+        log = HistoryLog(os.path.join(self.tmpdir.name, 'nothing.log'))
+        self.assertEqual(list(log.commands_under('/')), [])
+
+    def test_directory_lines_boost(self) -> None:
+        lines = Selecta.merge_directory_lines(['a', 'b', 'c'], ['c', 'x', 'c'], directory_only=False)
+        self.assertEqual(lines, ['c', 'x', 'a', 'b'])
+
+    def test_directory_lines_only(self) -> None:
+        lines = Selecta.merge_directory_lines(['a', 'b', 'c'], ['c', 'x', 'c'], directory_only=True)
+        self.assertEqual(lines, ['c', 'x'])